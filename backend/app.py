@@ -1,22 +1,40 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from pymongo import MongoClient
 import os
+import sys
+import multiprocessing
+import threading
 from dotenv import load_dotenv
 from datetime import datetime
 import traceback
+import time
+import uuid
 
-# Import our modules
-from twitter_client import TwitterClient
-from sentiment_analyzer import SentimentAnalyzer
-from toxicity_detector import ToxicityDetector
+# Import our modules (model-backed modules are imported lazily by their factories)
+from components import ComponentRegistry
+from dedup import MAX_DISTANCE as DEDUP_DISTANCE_LIMIT, cluster_near_duplicates
+from tweet_batch import TweetBatch
+from pipeline import EXECUTOR as PIPELINE_EXECUTOR, Stage, StageDAG
+from jobs import JobQueue, QueueFull
+from result_cache import ResultCache, make_key
+from single_flight import SingleFlight
+from serialization import COMPRESS_MIN_BYTES, ENCODINGS, columnar_result, compress, dumps
+from metrics import REGISTRY as METRICS
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:3000", "http://localhost:3001"])
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# With several server processes (gunicorn.conf.py), emits and room joins reach
+# clients connected to other workers through this queue (e.g. redis://localhost:6379/0);
+# unset, Socket.IO state is in-process
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', message_queue=SOCKETIO_MESSAGE_QUEUE)
+
+# Set by gunicorn.conf.py: this process is a pre-fork server master
+PREFORK = os.getenv('PREFORK_SERVER', 'False').lower() == 'true'
 
 # Initialize services GLOBALLY (load once)
 print("\n" + "="*60)
@@ -27,57 +45,327 @@ print("="*60)
 MONGO_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'convosense')
 
-try:
-    mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    db = mongo_client[DATABASE_NAME]
-    mongo_client.server_info()
-    print(f"✅ MongoDB connected: {DATABASE_NAME}")
-except Exception as e:
-    print(f"⚠️  MongoDB connection failed: {e}")
-    print(f"⚠️  Continuing without database...")
-    db = None
-
-# Initialize AI services - THESE LOAD ONCE AT STARTUP
-twitter_client = None
-sentiment_analyzer = None
-toxicity_detector = None
+def _connect_database():
+    try:
+        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+        database = client[DATABASE_NAME]
+        client.server_info()
+        print(f"✅ MongoDB connected: {DATABASE_NAME}")
+        return database
+    except Exception as e:
+        print(f"⚠️  MongoDB connection failed: {e}")
+        print(f"⚠️  Continuing without database...")
+        return None
 
-try:
-    print("🐦 Initializing Twitter client...")
-    twitter_client = TwitterClient()
-    print("✅ Twitter client ready")
-except Exception as e:
-    print(f"❌ Twitter client failed: {e}")
+# Sentiment process-pool workers (SENTIMENT_WORKERS) re-import this module
+# under spawn; only the main process connects and loads services
+IS_MAIN_PROCESS = multiprocessing.current_process().name == 'MainProcess'
 
-try:
+# A pre-fork master leaves this to the workers (MongoClient is not fork-safe)
+db = _connect_database() if IS_MAIN_PROCESS and not PREFORK else None
+
+# Initialize AI services - THESE LOAD ONCE, ON A BACKGROUND THREAD,
+# so /api/health answers while models load
+def _create_twitter_client():
+    from twitter_client import TwitterClient
+    return TwitterClient()
+
+def _create_sentiment_analyzer():
+    from sentiment_analyzer import SentimentAnalyzer
     print("🧠 Loading sentiment analysis model (this may take 30-60 seconds)...")
-    sentiment_analyzer = SentimentAnalyzer()
-    print("✅ Sentiment analyzer ready")
-except Exception as e:
-    print(f"❌ Sentiment analyzer failed: {e}")
+    return SentimentAnalyzer()
+
+def _create_sentiment_scheduler():
+    from inference_scheduler import InferenceScheduler
+    analyzer = services.get('sentiment')
+    if analyzer is None:
+        raise RuntimeError("sentiment analyzer unavailable")
+    # Micro-batch texts from concurrent requests on one worker
+    return InferenceScheduler(analyzer)
+
+def _create_toxicity_detector():
+    from toxicity_detector import ToxicityDetector
+    return ToxicityDetector()
+
+def _create_analytics_engine():
+    from modules.analytics import AnalyticsEngine
+    
+    def shared_sentiment():
+        # Reuse the SentimentAnalyzer's model instead of loading a second pipeline
+        analyzer = services.get('sentiment')
+        if analyzer is None:
+            raise RuntimeError("sentiment analyzer unavailable")
+        
+        def analyze(text):
+            # AnalyticsEngine expects the pipeline's {'label', 'score'} shape
+            result = analyzer.analyze(text)
+            return {'label': result['sentiment'], 'score': result['confidence']}
+        return analyze
+    
+    return AnalyticsEngine(sentiment_loader=shared_sentiment)
 
+# The torch model can be built before a fork and shared by the workers; ONNX
+# Runtime sessions and the sentiment process pool start threads, so those
+# backends are built in each worker instead
+SENTIMENT_PER_PROCESS = (
+    os.getenv('SENTIMENT_BACKEND', 'torch').lower() != 'torch'
+    or int(os.getenv('SENTIMENT_WORKERS', 0)) > 1
+)
+
+services = ComponentRegistry()
+services.register('twitter', _create_twitter_client)
+services.register('sentiment', _create_sentiment_analyzer, warmup=lambda analyzer: analyzer.warmup(),
+                  per_process=SENTIMENT_PER_PROCESS)
+# Owns the batching thread
+services.register('scheduler', _create_sentiment_scheduler, per_process=True)
+services.register('toxicity', _create_toxicity_detector)
+# Topic modeling only; built on the first request that needs it
+services.register('analytics', _create_analytics_engine, lazy=True)
+
+# Components /api/analyze waits for, and how long (0 = fail fast with 503)
+ANALYZE_COMPONENTS = ['twitter', 'sentiment', 'scheduler', 'toxicity']
+ANALYZE_READY_TIMEOUT = float(os.getenv('ANALYZE_READY_TIMEOUT', 0))
+
+# Perspective API for toxicity (needs a quota sized via PERSPECTIVE_QPS), else the local model/keywords
+TOXICITY_USE_API = os.getenv('TOXICITY_USE_API', 'False').lower() == 'true'
+
+# Near-duplicate collapsing before sentiment/toxicity scoring
+DEDUP_ENABLED = os.getenv('DEDUP_TWEETS', 'True').lower() == 'true'
+DEDUP_MAX_DISTANCE = int(os.getenv('DEDUP_MAX_DISTANCE', 3))
+if not 0 <= DEDUP_MAX_DISTANCE <= DEDUP_DISTANCE_LIMIT:
+    clamped = min(max(DEDUP_MAX_DISTANCE, 0), DEDUP_DISTANCE_LIMIT)
+    print(f"⚠️ DEDUP_MAX_DISTANCE must be 0-{DEDUP_DISTANCE_LIMIT}, got {DEDUP_MAX_DISTANCE} - using {clamped}")
+    DEDUP_MAX_DISTANCE = clamped
+
+# Per-stage time limit for /api/analyze (0 = none); a slow stage falls back to neutral results
+PIPELINE_STAGE_TIMEOUT = float(os.getenv('PIPELINE_STAGE_TIMEOUT', 60))
+
+# Async analyses ({"async": true}): JOB_WORKERS threads serve a queue of at most
+# JOB_QUEUE_SIZE jobs; submissions beyond that get 429. With RESULT_STORE_PATH,
+# job states go to the shared store too, so GET /api/jobs/<id> works on any worker
+# (disk only: a worker's memory tier would keep serving a stale state)
+analysis_jobs = JobQueue(store=ResultCache(
+    max_entries=0,
+    path=os.getenv('RESULT_STORE_PATH'),
+    table='jobs',
+    ttl=float(os.getenv('JOB_RESULT_TTL', 3600))
+) if os.getenv('RESULT_STORE_PATH') else None)
+JOB_RETRY_AFTER = int(os.getenv('JOB_RETRY_AFTER', 5))
+
+# Completed analyses by normalized query + max_tweets, served for ANALYSIS_CACHE_TTL
+# seconds (0 disables); concurrent identical requests share one pipeline run
+ANALYSIS_CACHE_TTL = float(os.getenv('ANALYSIS_CACHE_TTL', 60))
+analysis_cache = ResultCache(
+    max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', 256)),
+    path=os.getenv('ANALYSIS_CACHE_PATH') or None,
+    table='analyses',
+    ttl=ANALYSIS_CACHE_TTL
+) if ANALYSIS_CACHE_TTL > 0 else None
+analysis_flights = SingleFlight()
+
+# Full results behind the compact analysis_complete event, fetched once via
+# GET /api/results/<id> (RESULT_STORE_TTL seconds). Set RESULT_STORE_PATH when
+# running several workers so any of them can serve a result.
+analysis_results = ResultCache(
+    max_entries=int(os.getenv('RESULT_STORE_SIZE', 256)),
+    path=os.getenv('RESULT_STORE_PATH') or None,
+    table='results',
+    ttl=float(os.getenv('RESULT_STORE_TTL', 600))
+)
 try:
-    print("⚠️  Initializing toxicity detector...")
-    toxicity_detector = ToxicityDetector()
-    print("✅ Toxicity detector ready")
-except Exception as e:
-    print(f"❌ Toxicity detector failed: {e}")
+    import msgpack
+except ImportError:
+    msgpack = None
+
+STAGE_MESSAGES = {
+    'dedup': '✅ Near-duplicates collapsed',
+    'sentiment': '✅ Sentiment analysis complete',
+    'toxicity': '✅ Toxicity detection complete',
+    'topics': '✅ Topic extraction complete'
+}
+
+# Metrics (GET /api/metrics): histograms and counters are updated inline;
+# the rest is read from the services' own stats() at scrape time
+STAGE_SECONDS = METRICS.histogram(
+    'convosense_stage_duration_seconds',
+    'Latency of each analysis stage: fetch, dedup, sentiment, toxicity, topics, mongo_insert, serialization, compression',
+    ['stage']
+)
+ANALYSIS_SECONDS = METRICS.histogram(
+    'convosense_analysis_duration_seconds', 'End-to-end analysis pipeline latency by HTTP status', ['status']
+)
+ANALYSIS_REQUESTS = METRICS.counter(
+    'convosense_analysis_requests_total', 'Analysis requests by how they were served (computed, cached, coalesced)', ['served']
+)
+STAGE_OUTCOMES = METRICS.counter(
+    'convosense_stage_outcomes_total', 'Settled pipeline stages by status (done, failed, timed_out)', ['stage', 'status']
+)
+TWEETS_PROCESSED = METRICS.counter('convosense_tweets_processed_total', 'Tweets fetched and analyzed')
+TOXICITY_SCORED = METRICS.counter(
+    'convosense_toxicity_scored_total', 'Texts scored for toxicity by tier (cache, perspective, model, keywords)', ['tier']
+)
+
+
+def _cache_stats():
+    sentiment_analyzer = services.get('sentiment')
+    toxicity_detector = services.get('toxicity')
+    caches = {
+        'sentiment': sentiment_analyzer and sentiment_analyzer.cache,
+        'toxicity': toxicity_detector and toxicity_detector.cache,
+        'analysis': analysis_cache,
+        'results': analysis_results
+    }
+    return {name: cache.stats() for name, cache in caches.items() if cache}
+
+
+def _model_errors():
+    sentiment_analyzer = services.get('sentiment')
+    sentiment_scheduler = services.get('scheduler')
+    errors = {('component_load',): sum(1 for info in services.status().values() if info['state'] == 'failed')}
+    if sentiment_analyzer:
+        errors[('sentiment',)] = sentiment_analyzer.errors
+    if sentiment_scheduler:
+        errors[('scheduler',)] = sentiment_scheduler.stats()['failed_batches']
+    return errors
+
+
+def _queue_depths():
+    sentiment_scheduler = services.get('scheduler')
+    depths = {('jobs',): analysis_jobs.stats()['queue_depth']}
+    if sentiment_scheduler:
+        depths[('inference',)] = sentiment_scheduler.stats()['queue_depth']
+    return depths
+
+
+def _toxicity_fallbacks():
+    toxicity_detector = services.get('toxicity')
+    if toxicity_detector and toxicity_detector.client:
+        return {(): toxicity_detector.client.stats()['fallbacks']}
+    return {(): 0}
+
+
+METRICS.callback('convosense_cache_hits_total', 'Result cache hits by cache',
+                 lambda: {(name,): stats['hits'] for name, stats in _cache_stats().items()}, ['cache'], type='counter')
+METRICS.callback('convosense_cache_misses_total', 'Result cache misses by cache',
+                 lambda: {(name,): stats['misses'] for name, stats in _cache_stats().items()}, ['cache'], type='counter')
+METRICS.callback('convosense_toxicity_fallbacks_total', 'Perspective API calls that failed and were scored locally',
+                 _toxicity_fallbacks, type='counter')
+METRICS.callback('convosense_model_errors_total', 'Model failures: failed component loads, sentiment batches and scheduler batches',
+                 _model_errors, ['component'], type='counter')
+METRICS.callback('convosense_queue_depth', 'Items waiting in the job and inference queues', _queue_depths, ['queue'])
+METRICS.callback('convosense_jobs_running', 'Analysis jobs currently running',
+                 lambda: {(): analysis_jobs.stats()['running']})
+METRICS.callback('convosense_analyses_in_flight', 'Distinct analyses currently running (after coalescing)',
+                 lambda: {(): analysis_flights.stats()['in_flight']})
+METRICS.callback('convosense_model_loaded', '1 when the service is loaded and ready',
+                 lambda: {(name,): int(info['state'] == 'ready') for name, info in services.status().items()}, ['component'])
+
+
+def _dedup_groups(representatives, duplicate_of):
+    """Cluster membership for dedup results, plus a fan_out() copying results to members"""
+    members = {rep: [rep] for rep in representatives}
+    for i, rep in enumerate(duplicate_of):
+        if rep is not None:
+            members[rep].append(i)
+    
+    def fan_out(representative_results):
+        """Copy each representative's result to every tweet of its cluster"""
+        results = [None] * len(duplicate_of)
+        for rep, result in zip(representatives, representative_results):
+            for i in members[rep]:
+                results[i] = result
+        return results
+    
+    return {
+        'representatives': representatives,
+        'duplicate_of': duplicate_of,
+        'members': members,
+        'fan_out': fan_out
+    }
+
+
+def _neutral_sentiment(count):
+    """All-NEUTRAL sentiments and summary, when no analyzer is available"""
+    return [{'sentiment': 'NEUTRAL', 'confidence': 0.0}] * count, {
+        'positive': 0, 'negative': 0, 'neutral': count,
+        'positive_percentage': 0, 'negative_percentage': 0, 'neutral_percentage': 100,
+        'total': count
+    }
+
+
+class _StageProgress:
+    """Progress percentage from the number of settled stages (plus a partial stage fraction)"""
+    
+    def __init__(self, stages, start=20, end=100):
+        self.stages = stages
+        self.start = start
+        self.end = end
+        self.settled = 0
+    
+    def value(self, partial=0.0):
+        fraction = min(1.0, (self.settled + partial) / self.stages)
+        return self.start + int((self.end - self.start) * fraction)
+
+def after_fork():
+    """
+    Per-worker setup under a pre-fork server (gunicorn.conf.py post_fork):
+    connect MongoDB, pin the torch thread budget, then warm up the preloaded
+    services and build the per-process ones on the background loader
+    """
+    global db
+    db = _connect_database()
+    threads = int(os.getenv('SENTIMENT_THREADS_PER_WORKER', 0))
+    if threads and 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+    print(f"⏳ Worker {os.getpid()}: warming up services (see /api/ready)")
+    services.start_background()
+
+if IS_MAIN_PROCESS:
+    if PREFORK:
+        # Synchronously, so the models exist before the workers are forked
+        print("⏳ Preloading services before forking workers")
+        services.preload()
+    else:
+        print("⏳ Loading services in the background (see /api/ready)")
+        services.start_background()
 
 print("="*60 + "\n")
 
 # Routes
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    sentiment_analyzer = services.get('sentiment')
+    sentiment_scheduler = services.get('scheduler')
+    toxicity_detector = services.get('toxicity')
     return jsonify({
         "status": "healthy",
         "database": "connected" if db is not None else "disconnected",
         "services": {
-            "twitter": "ready" if twitter_client else "unavailable",
-            "sentiment": "ready" if sentiment_analyzer else "unavailable",
-            "toxicity": "ready" if toxicity_detector else "unavailable"
-        }
+            name: info['state'] for name, info in services.status().items()
+        },
+        "sentiment_batching": sentiment_analyzer.get_batching_stats() if sentiment_analyzer else None,
+        "sentiment_cache": sentiment_analyzer.get_cache_stats() if sentiment_analyzer else None,
+        "inference_scheduler": sentiment_scheduler.stats() if sentiment_scheduler else None,
+        "toxicity": toxicity_detector.get_stats() if toxicity_detector else None,
+        "jobs": analysis_jobs.stats(),
+        "analysis_cache": analysis_cache.stats() if analysis_cache else None,
+        "coalescing": analysis_flights.stats()
     }), 200
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics for this process"""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once every service has loaded, 503 before"""
+    ready = services.is_ready()
+    return jsonify({
+        "ready": ready,
+        "components": services.status()
+    }), 200 if ready else 503
+
 @app.route('/api/users/create', methods=['POST'])
 def create_user():
     try:
@@ -127,158 +415,364 @@ def get_user(uid):
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_tweets():
+    data = request.get_json(silent=True) or {}
+    error = _request_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    # Job mode: queue the analysis and return its id immediately
+    if data.get('async'):
+        return submit_analysis_job(data)
+    
+    # Events go to the requesting client only (its Socket.IO sid)
+    payload, status = run_analysis(data, _session_emitter(data.get('sid')))
+    return _encoded_response(_layout(payload), status)
+
+def _layout(result):
+    """result in the layout the client asked for: ?layout=columnar or per-tweet records"""
+    if request.args.get('layout') == 'columnar':
+        return columnar_result(result)
+    return result
+
+def _encoded_response(payload, status=200, body=None, mimetype='application/json'):
+    """
+    Response with the payload serialized by the fast JSON serializer (or a
+    pre-encoded body), compressed with brotli or gzip per Accept-Encoding
+    once it is at least COMPRESS_MIN_BYTES
+    """
+    if body is None:
+        with STAGE_SECONDS.time(stage='serialization'):
+            body = dumps(payload)
+    response = Response(body, status=status, mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(ENCODINGS) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        with STAGE_SECONDS.time(stage='compression'):
+            response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def _publish_result(result, emit):
+    """
+    Keep the full result in the result store and emit a compact
+    analysis_complete: summary stats plus a reference the client fetches
+    once, so egress per event does not grow with the number of tweets
+    """
+    analysis_results.set(result['result_id'], result)
+    emit('analysis_complete', {
+        **{key: value for key, value in result.items() if key != 'tweets'},
+        'result_url': f"/api/results/{result['result_id']}",
+        'progress': 100
+    })
+
+def _session_emitter(sid):
+    """emit(event, payload) to one Socket.IO session; a no-op without a sid"""
+    def emit_to_session(event, payload):
+        if sid:
+            socketio.emit(event, payload, to=sid)
+    return emit_to_session
+
+def run_analysis(data, emit):
+    """
+    Fetch and analyze tweets for data['query']; returns (payload, status code).
+    Progress events go through emit(event, payload): the requesting
+    session for synchronous requests, the job's room for jobs.
+    
+    Identical requests (normalized query + max_tweets) are coalesced: a
+    fresh cached result is returned as is (with cached_at), and concurrent
+    misses share one in-flight pipeline. force_refresh skips the cache.
+    """
+    query = data.get('query', '')
+    if not query:
+        return _analyze(data, emit)
+    
+    key = make_key(query, f"analysis:max_tweets={_max_tweets(data)}")
+    if not data.get('force_refresh') and analysis_cache:
+        cached = analysis_cache.get(key)
+        if cached is not None:
+            print(f"♻️ Serving cached analysis for '{query}' (from {cached['cached_at']})")
+            ANALYSIS_REQUESTS.inc(served='cached')
+            _publish_result(cached, emit)
+            return cached, 200
+    
+    (payload, status), shared = analysis_flights.do(key, lambda: _analyze(data, emit))
+    ANALYSIS_REQUESTS.inc(served='coalesced' if shared else 'computed')
+    if shared:
+        # The leader's progress went to its own client; send ours the outcome
+        if status == 200:
+            _publish_result(payload, emit)
+        else:
+            emit('analysis_error', {'error': payload.get('error')})
+    elif status == 200 and analysis_cache:
+        analysis_cache.set(key, {**payload, 'cached_at': datetime.now().isoformat()})
+    return payload, status
+
+def _request_error(data):
+    """
+    Why an /api/analyze body is malformed, or None. Checked before the cache
+    key is built, so bad input gets a 400 instead of an unhandled 500.
+    Coerces max_tweets to an int in place.
+    """
+    if not isinstance(data, dict):
+        return "Request body must be a JSON object"
+    if not isinstance(data.get('query', ''), str):
+        return "Query must be a string"
+    try:
+        max_tweets = int(data.get('max_tweets', 100))
+    except (TypeError, ValueError):
+        return "max_tweets must be an integer"
+    if max_tweets < 1:
+        return "max_tweets must be at least 1"
+    data['max_tweets'] = max_tweets
+    return None
+
+def _max_tweets(data):
+    return min(data.get('max_tweets', 100), 100)  # Allow up to 100 tweets
+
+def _analyze(data, emit):
+    """The full pipeline for one request (see run_analysis), timed"""
+    start = time.perf_counter()
+    payload, status = _run_pipeline(data, emit)
+    ANALYSIS_SECONDS.observe(time.perf_counter() - start, status=status)
+    return payload, status
+
+def _run_pipeline(data, emit):
     try:
-        data = request.json
         query = data.get('query', '')
-        max_tweets = min(data.get('max_tweets', 100), 100)  # Allow up to 100 tweets
+        max_tweets = _max_tweets(data)
+        stream = data.get('stream', True)  # Emit per-batch sentiment results
         
         if not query:
-            return jsonify({"error": "Query is required"}), 400
+            return {"error": "Query is required"}, 400
+        
+        # Fail fast (or wait up to ANALYZE_READY_TIMEOUT) while models are still loading
+        loading = services.wait_for(ANALYZE_COMPONENTS, timeout=ANALYZE_READY_TIMEOUT)
+        if loading:
+            return {
+                "error": "Services are still loading, try again shortly",
+                "loading": loading
+            }, 503
+        
+        twitter_client = services.get('twitter')
+        sentiment_analyzer = services.get('sentiment')
+        sentiment_scheduler = services.get('scheduler')
+        toxicity_detector = services.get('toxicity')
         
         if not twitter_client:
-            return jsonify({"error": "Twitter service unavailable"}), 503
+            return {"error": "Twitter service unavailable"}, 503
         
         print(f"\n{'='*60}")
         print(f"🔍 Starting analysis for: '{query}'")
         print(f"{'='*60}\n")
         
         # Step 1: Fetch tweets (5%)
-        socketio.emit('analysis_update', {
+        emit('analysis_update', {
             'status': 'fetching',
             'message': f'🐦 Fetching tweets for "{query}"...',
             'progress': 5
         })
         
-        tweets = twitter_client.search_tweets(query, max_results=max_tweets)
+        with STAGE_SECONDS.time(stage='fetch'):
+            tweets = twitter_client.search_tweets(query, max_results=max_tweets)
         
         if not tweets:
-            socketio.emit('analysis_error', {
+            emit('analysis_error', {
                 'error': 'No tweets found for this query'
             })
-            return jsonify({
+            return {
                 "error": "No tweets found",
                 "query": query,
                 "suggestion": "Try a different keyword or hashtag"
-            }), 404
+            }, 404
         
-        socketio.emit('analysis_update', {
+        emit('analysis_update', {
             'status': 'fetched',
             'message': f'✅ Found {len(tweets)} tweets',
             'progress': 20
         })
         
-        # Step 2: Analyze sentiment (70% of work)
-        socketio.emit('analysis_update', {
-            'status': 'analyzing_sentiment',
-            'message': f'🧠 Analyzing sentiment for {len(tweets)} tweets...',
-            'progress': 30
-        })
-        
-        if sentiment_analyzer:
-            tweet_texts = [tweet['text'] for tweet in tweets]
-            sentiments = sentiment_analyzer.analyze_batch(tweet_texts)
-            overall_sentiment = sentiment_analyzer.get_overall_sentiment(sentiments)
+        # Columnar batch, tokenized once; every stage reads its columns and the
+        # response dicts are only built at the end
+        batch = TweetBatch.from_tweets(tweets)
+        
+        # Stages after the fetch form a small DAG: dedup feeds sentiment and
+        # toxicity, topics only needs the batch. Independent stages run
+        # concurrently; a failed or timed-out stage falls back to neutral
+        # results without holding up the others.
+        total = len(batch)
+        
+        def run_dedup(_):
+            # Collapse near-duplicates (same text with another URL, mention or emoji):
+            # only one representative per cluster is scored, then fanned out
+            if DEDUP_ENABLED:
+                representatives, duplicate_of = cluster_near_duplicates(
+                    batch.texts, max_distance=DEDUP_MAX_DISTANCE, tokens=batch.tokens
+                )
+            else:
+                representatives, duplicate_of = list(range(total)), [None] * total
+            print(f"🧬 Dedup: {total} tweets -> {len(representatives)} clusters")
+            return _dedup_groups(representatives, duplicate_of)
+        
+        # Closed once the pipeline settles: a timed-out sentiment stage may
+        # still have batches in flight, and none may follow analysis_complete
+        partials_lock = threading.Lock()
+        partials_open = True
+        
+        def run_sentiment(inputs, deadline):
+            groups = inputs['dedup']
+            if not (sentiment_analyzer and sentiment_scheduler):
+                return _neutral_sentiment(total)
+            
+            # Streaming mode: push each inference batch as soon as it is scored
+            on_batch = None
+            if stream:
+                scored = [None] * total
+                
+                def on_batch(indices, batch_results):
+                    # indices point at representatives; expand to their clusters
+                    batch_tweets = []
+                    for position, sentiment in zip(indices, batch_results):
+                        for i in groups['members'][groups['representatives'][position]]:
+                            scored[i] = sentiment
+                            batch_tweets.append(batch.record(i, sentiment=sentiment))
+                    done = [s for s in scored if s is not None]
+                    with partials_lock:
+                        if not partials_open:
+                            return
+                        emit('analysis_partial', {
+                            'query': query,
+                            'tweets': batch_tweets,
+                            'sentiment': sentiment_analyzer.get_overall_sentiment(done),
+                            'scored': len(done),
+                            'total': total,
+                            'progress': progress.value(partial=len(done) / total)
+                        })
+            
+            representative_texts = [batch.texts[rep] for rep in groups['representatives']]
+            # The request is cancelled (its unscored texts dropped) when the stage times out
+            sentiments = groups['fan_out'](sentiment_scheduler.analyze_batch(
+                representative_texts, on_batch=on_batch,
+                timeout=max(0.0, deadline - time.time()) if deadline else None
+            ))
             print(f"✅ Sentiment analysis complete")
-        else:
-            sentiments = [{'sentiment': 'NEUTRAL', 'confidence': 0.0}] * len(tweets)
-            overall_sentiment = {
-                'positive': 0, 'negative': 0, 'neutral': len(tweets),
-                'positive_percentage': 0, 'negative_percentage': 0, 'neutral_percentage': 100,
-                'total': len(tweets)
-            }
-        
-        socketio.emit('analysis_update', {
-            'status': 'sentiment_done',
-            'message': '✅ Sentiment analysis complete',
-            'progress': 70
-        })
-        
-        # Step 3: Detect toxicity (ALL tweets with fallback detector)
-        socketio.emit('analysis_update', {
-            'status': 'detecting_toxicity',
-            'message': '⚠️  Detecting toxic content...',
-            'progress': 80
-        })
+            return sentiments, sentiment_analyzer.get_overall_sentiment(sentiments)
         
-        toxicity_results = []
-        if toxicity_detector:
-            # Analyze ALL tweets using fallback detector (fast keyword-based)
-            all_texts = [tweet['text'] for tweet in tweets]
+        def run_toxicity(inputs, deadline):
+            groups = inputs['dedup']
+            if not toxicity_detector:
+                return [{'toxicity': 0.0, 'is_toxic': False} for _ in range(total)]
             
-            # Use fallback detector for all tweets (no API calls, instant)
-            toxicity_results = []
-            for text in all_texts:
-                toxicity_results.append(toxicity_detector._default_response(text))
+            # Duplicates share their representative's result
+            representatives = groups['representatives']
+            representative_texts = [batch.texts[rep] for rep in representatives]
+            if TOXICITY_USE_API and toxicity_detector.client:
+                # Concurrent, rate-limited Perspective API calls (keyword fallback per call)
+                # Leave a moment to fill in local scores before the stage itself times out
+                api_deadline = deadline - 1.0 if deadline else None
+                outcomes = {}
+                toxicity_results = groups['fan_out'](
+                    toxicity_detector.analyze_batch(representative_texts, api_deadline, outcomes=outcomes)
+                )
+                for tier, count in outcomes.items():
+                    TOXICITY_SCORED.inc(count, tier=tier)
+            else:
+                # Local linear model or keyword detector (no API calls)
+                TOXICITY_SCORED.inc(len(representatives), tier='model' if toxicity_detector.model else 'keywords')
+                toxicity_results = groups['fan_out'](toxicity_detector.score_batch(
+                    representative_texts, lowered=[batch.lowered[rep] for rep in representatives]
+                ))
             
             toxic_count = sum(1 for r in toxicity_results if r.get('is_toxic', False))
-            print(f"✅ Toxicity detection complete (analyzed {len(tweets)} tweets, found {toxic_count} toxic)")
-        else:
-            toxicity_results = [
-                {'toxicity': 0.0, 'is_toxic': False} for _ in tweets
-            ]
-        
-        socketio.emit('analysis_update', {
-            'status': 'toxicity_done',
-            'message': '✅ Toxicity detection complete',
-            'progress': 90
-        })
+            print(f"✅ Toxicity detection complete (analyzed {total} tweets, found {toxic_count} toxic)")
+            return toxicity_results
         
-        # Step 4: Extract topics using LDA
-        socketio.emit('analysis_update', {
-            'status': 'extracting_topics',
-            'message': '🔍 Extracting trending topics...',
-            'progress': 95
-        })
-        
-        topics = []
-        try:
-            from modules.analytics import AnalyticsEngine
-            analytics = AnalyticsEngine()
+        def run_topics(_):
+            analytics = services.get('analytics')
+            if analytics is None:
+                raise RuntimeError("analytics engine unavailable")
             
-            # Get cleaned tweet texts
-            tweet_texts = [tweet['text'] for tweet in tweets]
+            # Perform LDA topic modeling on the batch's shared tokens
+            lda_topics = analytics.perform_lda(batch.texts, num_topics=5, query=query, tokens=batch.tokens)
             
-            # Perform LDA topic modeling
-            lda_topics = analytics.perform_lda(tweet_texts, num_topics=5)
-            
-            # Extract top words from each topic
+            # Top 3 words per topic (terms are sorted by weight); a single
+            # keyphrase list (TOPIC_MODE=ctfidf without clusters) gives all of its terms
+            topics = []
+            words_per_topic = 3 if len(lda_topics) > 1 else 10
             for topic in lda_topics:
-                # Parse topic words (format: "0.123*word1 + 0.456*word2")
-                words_str = topic['words']
-                words = []
-                for item in words_str.split(' + '):
-                    word = item.split('*')[1].strip('"')
-                    words.append(word)
-                topics.extend(words[:3])  # Top 3 words per topic
+                topics.extend(term['word'] for term in topic['terms'][:words_per_topic])
             
             # Remove duplicates and limit to top 10
             topics = list(dict.fromkeys(topics))[:10]
             print(f"✅ Topic extraction complete: {topics}")
-        except Exception as e:
-            print(f"⚠️ Topic extraction error: {e}")
-            topics = []
+            return topics
+        
+        def local_toxicity(error):
+            if not toxicity_detector:
+                return [{'toxicity': 0.0, 'is_toxic': False} for _ in range(total)]
+            return toxicity_detector.score_batch(batch.texts, lowered=batch.lowered)
+        
+        stages = [
+            Stage('dedup', run_dedup, fallback=lambda error: _dedup_groups(list(range(total)), [None] * total)),
+            Stage('sentiment', run_sentiment, deps=['dedup'], fallback=lambda error: _neutral_sentiment(total),
+                  deadline_aware=True),
+            # Past its deadline, unanswered API calls fall back per text; if the
+            # stage still fails or times out, every tweet is scored locally
+            Stage('toxicity', run_toxicity, deps=['dedup'], fallback=local_toxicity, deadline_aware=True),
+            Stage('topics', run_topics, fallback=lambda error: [])
+        ]
+        # Fetch accounts for the first 20%, stages share the rest equally
+        progress = _StageProgress(len(stages), start=20)
+        
+        def on_stage_complete(name, report, settled):
+            STAGE_SECONDS.observe(report['seconds'], stage=name)
+            STAGE_OUTCOMES.inc(stage=name, status=report['status'])
+            progress.settled = settled
+            emit('analysis_update', {
+                'status': f'{name}_{report["status"]}',
+                'message': STAGE_MESSAGES[name] if report['status'] == 'done' else f'⚠️ {name} {report["status"]}',
+                'stage': name,
+                'stage_seconds': report['seconds'],
+                'progress': progress.value()
+            })
         
-        socketio.emit('analysis_update', {
+        emit('analysis_update', {
+            'status': 'analyzing',
+            'message': f'🧠 Analyzing {total} tweets (sentiment, toxicity, topics)...',
+            'progress': progress.value()
+        })
+        
+        outputs, stage_report = StageDAG(stages, PIPELINE_EXECUTOR, default_timeout=PIPELINE_STAGE_TIMEOUT).run(
+            on_complete=on_stage_complete
+        )
+        with partials_lock:
+            partials_open = False
+        groups = outputs['dedup']
+        representatives, duplicate_of = groups['representatives'], groups['duplicate_of']
+        sentiments, overall_sentiment = outputs['sentiment']
+        toxicity_results = outputs['toxicity']
+        topics = outputs['topics']
+        
+        emit('analysis_update', {
             'status': 'complete',
             'message': '✅ Analysis complete!',
             'progress': 100
         })
         
         # Step 4: Combine results
-        analyzed_tweets = []
-        for i, tweet in enumerate(tweets):
-            analyzed_tweets.append({
-                **tweet,
-                'sentiment': sentiments[i],
-                'toxicity': toxicity_results[i]
-            })
+        analyzed_tweets = batch.records(
+            sentiment=sentiments,
+            toxicity=toxicity_results,
+            duplicate_of=[batch.ids[rep] if rep is not None else None for rep in duplicate_of]
+        )
         
         # Step 5: Calculate statistics
         toxic_count = sum(1 for t in toxicity_results if t.get('is_toxic', False))
         
         result = {
+            'result_id': uuid.uuid4().hex,
             'query': query,
             'timestamp': datetime.now().isoformat(),
+            'cached_at': None,  # set on responses served from the analysis cache
             'tweets_analyzed': len(analyzed_tweets),
             'sentiment': overall_sentiment,
             'toxicity': {
@@ -286,6 +780,12 @@ def analyze_tweets():
                 'clean_count': len(analyzed_tweets) - toxic_count,
                 'toxicity_rate': round((toxic_count / len(analyzed_tweets)) * 100, 2) if analyzed_tweets else 0
             },
+            'dedup': {
+                'clusters': len(representatives),
+                'duplicates': len(batch) - len(representatives),
+                'largest_cluster': max(len(members) for members in groups['members'].values())
+            },
+            'stages': stage_report,
             'topics': topics,  # Add topics to response
             'tweets': analyzed_tweets
         }
@@ -293,19 +793,19 @@ def analyze_tweets():
         # Step 6: Save to MongoDB
         if db is not None:
             try:
-                db.analyses.insert_one({
-                    **result,
-                    'created_at': datetime.now()
-                })
+                with STAGE_SECONDS.time(stage='mongo_insert'):
+                    db.analyses.insert_one({
+                        **result,
+                        'created_at': datetime.now()
+                    })
                 print("✅ Analysis saved to database")
             except Exception as e:
                 print(f"⚠️ Failed to save to database: {e}")
         
-        # Step 7: Send final results
-        socketio.emit('analysis_complete', {
-            **result,
-            'progress': 100
-        })
+        TWEETS_PROCESSED.inc(len(analyzed_tweets))
+        
+        # Step 7: Send the summary and a reference to the full result
+        _publish_result(result, emit)
         
         print(f"\n{'='*60}")
         print(f"✅ Analysis complete for: '{query}'")
@@ -316,14 +816,86 @@ def analyze_tweets():
         print(f"   Toxic: {toxic_count} ({result['toxicity']['toxicity_rate']}%)")
         print(f"{'='*60}\n")
         
-        return jsonify(result), 200
+        return result, 200
         
     except Exception as e:
         error_msg = str(e)
         traceback.print_exc()
         print(f"❌ Analysis error: {error_msg}")
-        socketio.emit('analysis_error', {'error': error_msg})
-        return jsonify({"error": error_msg}), 500
+        emit('analysis_error', {'error': error_msg})
+        return {"error": error_msg}, 500
+
+def submit_analysis_job(data):
+    """
+    Queue an analysis job; 202 with its id, or 429 when the queue is full.
+    Progress events go to the job's room (job_<id>), tagged with the job id.
+    The submitting Socket.IO client (data['sid']) joins it automatically and
+    other clients can send join_job; without a socket, poll GET /api/jobs/<id>.
+    """
+    if not data.get('query'):
+        return jsonify({"error": "Query is required"}), 400
+    sid = data.get('sid')
+    
+    def run(job):
+        def emit(event, payload):
+            if 'progress' in payload:
+                job.progress = payload['progress']
+            if 'message' in payload:
+                job.message = payload['message']
+            if 'progress' in payload or 'message' in payload:
+                analysis_jobs.publish(job)
+            socketio.emit(event, {**payload, 'job_id': job.id}, to=f"job_{job.id}")
+        return run_analysis(data, emit)
+    
+    def join_submitter(job):
+        # Before the job can start, so no event is emitted to an empty room
+        if sid:
+            join_room(f"job_{job.id}", sid=sid, namespace='/')
+    
+    try:
+        job = analysis_jobs.submit(run, on_queued=join_submitter)
+    except QueueFull as e:
+        return jsonify({"error": "Too many queued analyses, retry later", "detail": str(e)}), 429, {
+            'Retry-After': str(JOB_RETRY_AFTER)
+        }
+    
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}"
+    }), 202
+
+@app.route('/api/results/<result_id>', methods=['GET'])
+def get_result(result_id):
+    """
+    Full analysis result referenced by analysis_complete. Sent as msgpack
+    with ?format=msgpack (or Accept: application/msgpack) when msgpack is
+    installed, compressed when the client accepts it.
+    """
+    result = analysis_results.get(result_id)
+    if result is None:
+        return jsonify({"error": "Result not found (unknown or expired)"}), 404
+    
+    result = _layout(result)
+    wants_msgpack = request.args.get('format') == 'msgpack' or 'application/msgpack' in request.headers.get('Accept', '')
+    if wants_msgpack:
+        if msgpack is None:
+            return jsonify({"error": "msgpack encoding unavailable (pip install msgpack)"}), 406
+        response = _encoded_response(None, body=msgpack.packb(result, use_bin_type=True), mimetype='application/msgpack')
+    else:
+        response = _encoded_response(result)
+    response.vary.add('Accept')
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status and progress; includes the result once finished"""
+    job = analysis_jobs.snapshot(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found (unknown or expired)"}), 404
+    if 'result' in job:
+        job['result'] = _layout(job['result'])
+    return _encoded_response(job)
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
@@ -337,7 +909,7 @@ def get_history():
             {'_id': 0}
         ).sort('created_at', -1).limit(20))
         
-        return jsonify(analyses), 200
+        return _encoded_response([_layout(analysis) for analysis in analyses])
     except Exception as e:
         print(f"❌ Error fetching history: {e}")
         return jsonify({"error": str(e)}), 500
@@ -348,6 +920,16 @@ def handle_connect():
     print('✅ Client connected')
     emit('connection_response', {'status': 'connected'})
 
+@socketio.on('join_job')
+def handle_join_job(data):
+    """Subscribe this session to a job's events (e.g. after a reconnect)"""
+    job_id = (data or {}).get('job_id')
+    if analysis_jobs.snapshot(job_id) is None:
+        emit('analysis_error', {'error': 'Job not found', 'job_id': job_id})
+        return
+    join_room(f"job_{job_id}")
+    emit('job_joined', {'job_id': job_id})
+
 @socketio.on('disconnect')
 def handle_disconnect():
     print('❌ Client disconnected')
@@ -358,10 +940,9 @@ if __name__ == '__main__':
     print("="*60)
     print(f"📊 Database: {DATABASE_NAME}")
     print(f"🔗 MongoDB: {'Connected' if db is not None else 'Disconnected'}")
-    print(f"🐦 Twitter API: {'Ready' if twitter_client else 'Unavailable'}")
-    print(f"🧠 Sentiment Analysis: {'Ready' if sentiment_analyzer else 'Unavailable'}")
-    print(f"⚠️  Toxicity Detection: {'Ready' if toxicity_detector else 'Unavailable'}")
+    print(f"⏳ Services: loading in background, check /api/ready")
     print(f"🌐 Server: http://localhost:5003")
+    print(f"🏭 Production: gunicorn -c gunicorn.conf.py")
     print("="*60 + "\n")
     
     socketio.run(app, debug=True, host='0.0.0.0', port=5003, allow_unsafe_werkzeug=True)
@@ -0,0 +1,27 @@
+import csv
+import sys
+
+from sentiment_analyzer import SentimentAnalyzer
+
+# Usage: python calibrate_cascade.py labeled.csv
+# The CSV needs 'text' and 'label' columns (POSITIVE / NEGATIVE / NEUTRAL).
+if len(sys.argv) < 2:
+    print("Usage: python calibrate_cascade.py labeled.csv")
+    sys.exit(1)
+
+with open(sys.argv[1], newline='', encoding='utf-8') as f:
+    rows = [row for row in csv.DictReader(f) if row.get('text')]
+
+texts = [row['text'] for row in rows]
+labels = [row['label'] for row in rows]
+
+analyzer = SentimentAnalyzer()
+report = analyzer.calibration_report(texts, labels)
+
+print("=" * 60)
+print(f"📊 CASCADE CALIBRATION ({report['samples']} labeled texts)")
+print("=" * 60)
+print(f"Transformer only: accuracy {report['transformer_accuracy']:.2%}")
+print(f"{'band':>14} {'accuracy':>10} {'escalated':>10}")
+for band in report['bands']:
+    print(f"{band['low']:>6.2f}-{band['high']:<6.2f} {band['accuracy']:>10.2%} {band['escalated_fraction']:>10.2%}")
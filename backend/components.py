@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict
+
+PENDING = 'pending'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class Component:
+    """A named service built by a factory, with optional warm-up"""
+
+    def __init__(self, name, factory, warmup=None, lazy=False, per_process=False):
+        self.name = name
+        self.factory = factory
+        self.warmup = warmup
+        self.lazy = lazy
+        self.per_process = per_process
+        self.state = PENDING
+        self.instance = None
+        self.error = None
+        self.load_seconds = None
+        self.settled = threading.Event()  # set once READY or FAILED
+
+
+class ComponentRegistry:
+    """
+    Loads services (models, API clients) on a background thread so the
+    web server can answer health checks while they start up. Lazy
+    components are skipped at startup and built by the first get().
+    Every component is a process-wide singleton.
+
+    Under a pre-fork server, preload() builds the fork-safe components in
+    the master so workers share their memory copy-on-write; each worker
+    then calls start_background() to warm them up and build the
+    per_process ones (anything that owns threads or pools).
+    """
+
+    def __init__(self):
+        self._components = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, name, factory, warmup=None, lazy=False, per_process=False):
+        """Register a component; eager components load in registration order"""
+        self._components[name] = Component(name, factory, warmup, lazy, per_process)
+
+    def load(self, name):
+        """Build (and warm up) one component in the calling thread"""
+        component = self._components[name]
+        with self._lock:
+            if component.state != PENDING:
+                return component.instance
+            component.state = LOADING
+
+        start = time.time()
+        try:
+            # Built by preload() before the fork: only the warm-up is left
+            instance = component.instance if component.instance is not None else component.factory()
+            if component.warmup and instance is not None:
+                component.warmup(instance)
+            component.instance = instance
+            component.state = READY
+        except Exception as e:
+            print(f"❌ {name} failed to load: {e}")
+            component.error = str(e)
+            component.state = FAILED
+        component.load_seconds = round(time.time() - start, 2)
+        component.settled.set()
+        return component.instance
+
+    def load_all(self):
+        for name, component in self._components.items():
+            if not component.lazy:
+                self.load(name)
+
+    def preload(self):
+        """
+        Build every eager component that is not per_process, in the calling
+        thread and without warm-up, ahead of a fork. Warm-up (the first
+        inference) creates torch/ONNX thread pools, which do not survive a
+        fork, so it is left to load() in each worker. Components stay
+        PENDING; one that fails here is retried by the workers.
+        """
+        for name, component in self._components.items():
+            if component.lazy or component.per_process or component.instance is not None:
+                continue
+            start = time.time()
+            try:
+                component.instance = component.factory()
+                print(f"✅ {name} preloaded in {time.time() - start:.2f}s")
+            except Exception as e:
+                print(f"⚠️ {name} failed to preload, workers will retry: {e}")
+
+    def start_background(self):
+        """Load every registered component on a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.load_all, name='component-loader', daemon=True)
+            self._thread.start()
+
+    def get(self, name):
+        """
+        The component instance, or None while loading or after a failure.
+        A lazy component is built on first call; concurrent callers wait for it.
+        """
+        component = self._components.get(name)
+        if component is None:
+            return None
+        if component.lazy and not component.settled.is_set():
+            self.load(name)
+            component.settled.wait()
+        if component.state != READY:
+            return None
+        return component.instance
+
+    def wait_for(self, names, timeout=0):
+        """
+        Wait up to timeout seconds for the named components to settle.
+        Returns the names that are still pending or loading.
+        """
+        deadline = time.time() + timeout
+        unsettled = []
+        for name in names:
+            remaining = max(0, deadline - time.time())
+            if not self._components[name].settled.wait(remaining):
+                unsettled.append(name)
+        return unsettled
+
+    def is_ready(self, names=None):
+        """All named components READY (default: every eager component)"""
+        names = names or [name for name, component in self._components.items() if not component.lazy]
+        return all(self._components[name].state == READY for name in names)
+
+    def status(self):
+        """Per-component state, load time and error"""
+        return {
+            name: {
+                'state': component.state,
+                'lazy': component.lazy,
+                'per_process': component.per_process,
+                'load_seconds': component.load_seconds,
+                'error': component.error
+            }
+            for name, component in self._components.items()
+        }
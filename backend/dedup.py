@@ -0,0 +1,110 @@
+import hashlib
+import re
+
+# Same normalization as AnalyticsEngine._preprocess_text: drop URLs and
+# mentions, keep hashtag words, lowercase
+_URL_RE = re.compile(r'http\S+|www\S+|https\S+')
+_MENTION_RE = re.compile(r'@\w+')
+_NON_WORD_RE = re.compile(r'[^a-z0-9\s]')
+
+FINGERPRINT_BITS = 64
+# 4-bit blocks; beyond this distance SimHash no longer means "near-identical"
+MAX_BANDS = 16
+MAX_DISTANCE = MAX_BANDS - 1
+
+
+def normalize_for_dedup(text):
+    """Lowercased words of a tweet without URLs, mentions, emoji or punctuation"""
+    text = (text or '').lower()
+    text = _URL_RE.sub(' ', text)
+    text = _MENTION_RE.sub(' ', text)
+    text = _NON_WORD_RE.sub(' ', text)
+    return text.split()
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.md5(feature.encode('utf-8')).digest()[:8], 'big')
+
+
+def simhash(tokens):
+    """64-bit SimHash over word unigrams and bigrams"""
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    weights = [0] * FINGERPRINT_BITS
+    for feature in features:
+        h = _feature_hash(feature)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def cluster_near_duplicates(texts, max_distance=3, bands=None, tokens=None):
+    """
+    Group near-identical texts with SimHash and LSH banding.
+    Fingerprints are split into `bands` blocks (default max_distance + 1);
+    by the pigeonhole principle two fingerprints within max_distance
+    (< bands) bits share at least one identical block, so only texts
+    colliding on a block are compared.
+
+    tokens (TweetBatch.tokens) replaces the per-text normalization.
+
+    Returns (representatives, duplicate_of): the index of one text per
+    cluster (its first occurrence), and for every text the index of its
+    representative, or None if it is a representative itself.
+    """
+    if not 0 <= max_distance <= MAX_DISTANCE:
+        raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}, got {max_distance}")
+    bands = bands or max_distance + 1
+    if not max_distance < bands <= MAX_BANDS:
+        raise ValueError(f"bands must be in ({max_distance}, {MAX_BANDS}] for max_distance={max_distance}, got {bands}")
+
+    count = len(texts)
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            # Keep the earliest text as the root/representative
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    # Block boundaries cover all 64 bits even when bands does not divide 64
+    blocks = []
+    for band in range(bands):
+        start, end = band * FINGERPRINT_BITS // bands, (band + 1) * FINGERPRINT_BITS // bands
+        blocks.append((start, (1 << (end - start)) - 1))
+    fingerprints = [None] * count
+    buckets = {}
+
+    for i, text in enumerate(texts):
+        words = tokens[i] if tokens is not None else normalize_for_dedup(text)
+        if not words:
+            continue  # Nothing left to compare (e.g. URL-only tweet)
+        fingerprint = simhash(words)
+        fingerprints[i] = fingerprint
+        for band, (shift, mask) in enumerate(blocks):
+            key = (band, (fingerprint >> shift) & mask)
+            for j in buckets.get(key, ()):
+                if find(i) != find(j) and bin(fingerprint ^ fingerprints[j]).count('1') <= max_distance:
+                    union(i, j)
+            buckets.setdefault(key, []).append(i)
+
+    representatives = []
+    duplicate_of = []
+    for i in range(count):
+        root = find(i)
+        if root == i:
+            representatives.append(i)
+            duplicate_of.append(None)
+        else:
+            duplicate_of.append(root)
+    return representatives, duplicate_of
@@ -0,0 +1,66 @@
+"""
+Production server: gunicorn -c gunicorn.conf.py
+
+Pre-forking gthread workers. The app (and the sentiment model) is loaded
+once in the master, then forked, so workers share the weights copy-on-write.
+Each worker warms up its copy and starts its own threads in post_fork.
+Sizing is explained in README.md ("Production").
+"""
+import gc
+import math
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Torch intra-op threads per worker. Set before app import so the master's
+# torch, and every worker it forks, start with this budget.
+torch_threads = int(os.getenv('SENTIMENT_THREADS_PER_WORKER', 2))
+os.environ['SENTIMENT_THREADS_PER_WORKER'] = str(torch_threads)
+os.environ.setdefault('OMP_NUM_THREADS', str(torch_threads))
+os.environ.setdefault('MKL_NUM_THREADS', str(torch_threads))
+os.environ['PREFORK_SERVER'] = 'True'
+
+# workers = cores / torch threads: inference in every worker can then run at once
+workers = int(os.getenv('GUNICORN_WORKERS', 0)) or max(1, _cores() // torch_threads)
+if workers > 1 and not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+    print(f"⚠️ {workers} workers need SOCKETIO_MESSAGE_QUEUE for cross-worker emits - running 1 worker")
+    workers = 1
+if workers > 1 and not os.getenv('RESULT_STORE_PATH'):
+    print(f"⚠️ {workers} workers need RESULT_STORE_PATH so any worker can serve results and jobs - running 1 worker")
+    workers = 1
+
+# In threading mode every Socket.IO connection holds a thread, as does every
+# request for its whole duration (a synchronous /api/analyze for its full run)
+expected_sockets = int(os.getenv('EXPECTED_SOCKET_CONNECTIONS', 100))
+threads = int(os.getenv('GUNICORN_THREADS', 0)) or math.ceil(expected_sockets / workers) + int(os.getenv('GUNICORN_HTTP_THREADS', 16))
+
+worker_class = 'gthread'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5003')
+wsgi_app = 'app:app'
+preload_app = True
+# Sockets are long-lived; this only bounds how long a worker waits on a silent one
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    # The app is loaded; freeze its objects into the permanent generation so
+    # the workers' garbage collector never writes to (and copies) their pages
+    gc.freeze()
+    server.log.info(f"Serving with {workers} workers x {threads} threads, {torch_threads} torch threads each")
+
+
+def post_fork(server, worker):
+    import app
+    app.after_fork()
@@ -0,0 +1,184 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+
+
+class _PendingRequest:
+    """
+    Texts of one caller and the future resolved when all are scored.
+    Cancelling the future cancels the request: its queued texts are
+    skipped and on_batch is not called again.
+    """
+    __slots__ = ('texts', 'results', 'remaining', 'future', 'on_batch', 'cancelled')
+
+    def __init__(self, texts, on_batch=None):
+        self.texts = texts
+        self.results = [None] * len(texts)
+        self.remaining = len(texts)
+        self.future = Future()
+        self.on_batch = on_batch
+        self.cancelled = False
+        self.future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        if future.cancelled():
+            self.cancelled = True
+
+
+class InferenceScheduler:
+    """
+    Cross-request micro-batching for sentiment inference.
+    Texts from all in-flight requests share one queue; a dedicated worker
+    thread forms batches of up to max_batch_size texts, waiting at most
+    max_wait_ms for a batch to fill, and resolves each request's future
+    once all of its texts are scored.
+    """
+
+    def __init__(self, analyzer, max_batch_size=None, max_wait_ms=None):
+        self.analyzer = analyzer
+        self.max_batch_size = int(max_batch_size or os.getenv('SCHEDULER_MAX_BATCH', 64))
+        self.max_wait = float(max_wait_ms if max_wait_ms is not None else os.getenv('SCHEDULER_MAX_WAIT_MS', 10)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        # Metrics
+        self.batches = 0
+        self.failed_batches = 0
+        self.texts_processed = 0
+        self.requests = 0
+        self.max_queue_depth = 0
+
+        self._worker = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+        self._worker.start()
+        print(f"✅ Inference scheduler started (max_batch={self.max_batch_size}, max_wait={self.max_wait * 1000:.0f}ms)")
+
+    def submit(self, texts, on_batch=None):
+        """
+        Queue texts for scoring; returns a Future resolving to the results list.
+        on_batch(indices, results) receives this request's partial results as
+        each inference batch completes. future.cancel() drops the texts not
+        yet scored.
+        """
+        request = _PendingRequest(list(texts), on_batch)
+        if not request.texts:
+            request.future.set_result([])
+            return request.future
+
+        with self._lock:
+            self.requests += 1
+        for index in range(len(request.texts)):
+            self._queue.put((request, index))
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+        return request.future
+
+    def analyze_batch(self, texts, on_batch=None, timeout=None):
+        """Blocking drop-in for SentimentAnalyzer.analyze_batch; cancelled on timeout"""
+        future = self.submit(texts, on_batch)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def _collect_batch(self):
+        """Block for the first item, then fill the batch until full or max_wait elapses"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect_batch()
+            # Texts of cancelled (timed-out or abandoned) requests are not scored
+            batch = [item for item in batch if item is not None and not item[0].cancelled]
+            if not batch:
+                continue
+
+            texts = [request.texts[index] for request, index in batch]
+            on_batch = self._partial_dispatcher(batch) if any(r.on_batch for r, _ in batch) else None
+            try:
+                results = self.analyzer.analyze_batch(texts, on_batch=on_batch)
+            except Exception as e:
+                print(f"❌ Inference scheduler batch failed: {e}")
+                with self._lock:
+                    self.failed_batches += 1
+                for request in {id(r): r for r, _ in batch}.values():
+                    if not request.future.done():
+                        self._settle(request.future.set_exception, e)
+                continue
+
+            with self._lock:
+                self.batches += 1
+                self.texts_processed += len(texts)
+
+            for (request, index), result in zip(batch, results):
+                request.results[index] = result
+                request.remaining -= 1
+                if request.remaining == 0 and not request.future.done():
+                    self._settle(request.future.set_result, request.results)
+
+    @staticmethod
+    def _settle(set_outcome, value):
+        """Resolve a future unless its caller cancelled it in the meantime"""
+        try:
+            set_outcome(value)
+        except InvalidStateError:
+            pass
+
+    @staticmethod
+    def _partial_dispatcher(batch):
+        """Route partial results of a merged batch back to each request's callback"""
+        def dispatch(positions, results):
+            per_request = {}
+            for position, result in zip(positions, results):
+                request, index = batch[position]
+                if request.on_batch:
+                    entry = per_request.setdefault(id(request), (request, [], []))
+                    entry[1].append(index)
+                    entry[2].append(result)
+            for request, indices, request_results in per_request.values():
+                if request.cancelled:
+                    continue
+                try:
+                    request.on_batch(indices, request_results)
+                except Exception as e:
+                    print(f"⚠️ Partial result callback failed: {e}")
+        return dispatch
+
+    def stop(self):
+        """Stop the worker after the current batch"""
+        self._stopped.set()
+        self._queue.put(None)
+
+    def stats(self):
+        """Queue depth and batch-fill metrics"""
+        with self._lock:
+            avg_batch = self.texts_processed / self.batches if self.batches else 0.0
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'requests': self.requests,
+                'batches': self.batches,
+                'failed_batches': self.failed_batches,
+                'texts_processed': self.texts_processed,
+                'avg_batch_size': round(avg_batch, 2),
+                'avg_batch_fill': round(avg_batch / self.max_batch_size, 4) if self.batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000
+            }
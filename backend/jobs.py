@@ -0,0 +1,182 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when max_queue jobs are already waiting"""
+
+
+class Job:
+    """One queued analysis: status, latest progress and the final (payload, status code)"""
+    __slots__ = ('id', 'fn', 'status', 'progress', 'message', 'result', 'status_code', 'error',
+                 'created_at', 'started_at', 'finished_at')
+
+    def __init__(self, fn):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.status = QUEUED
+        self.progress = 0
+        self.message = None
+        self.result = None
+        self.status_code = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self, include_result=True):
+        job = {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.status in (DONE, FAILED):
+            job['status_code'] = self.status_code
+            job['error'] = self.error
+            if include_result:
+                job['result'] = self.result
+        return job
+
+
+class JobQueue:
+    """
+    Bounded job queue served by a fixed pool of worker threads.
+    submit() raises QueueFull instead of letting work pile up, so a burst
+    costs at most workers running jobs plus max_queue waiting ones.
+    Finished jobs stay retrievable for result_ttl seconds (at most
+    max_retained of them). With a store (a ResultCache shared by all
+    server workers), each job's state is also written there, so any
+    worker can report on a job another one runs.
+    """
+
+    def __init__(self, workers=None, max_queue=None, result_ttl=None, max_retained=None, store=None):
+        self.workers = int(workers or os.getenv('JOB_WORKERS', 4))
+        self.max_queue = int(max_queue or os.getenv('JOB_QUEUE_SIZE', 32))
+        self.result_ttl = float(result_ttl or os.getenv('JOB_RESULT_TTL', 3600))
+        self.max_retained = int(max_retained or os.getenv('JOB_MAX_RETAINED', 1000))
+        self.store = store
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _start(self):
+        """Start the workers on first use (not at import, e.g. in spawned processes)"""
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'analysis-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn, on_queued=None):
+        """
+        Queue fn(job) -> (payload, status_code); returns the Job.
+        on_queued(job) runs before a worker can pick the job up.
+        Raises QueueFull when the queue is at capacity.
+        """
+        job = Job(fn)
+        with self._lock:
+            self._start()
+            self._prune()
+            if self._queue.full():
+                self.rejected += 1
+                raise QueueFull(f"{self.max_queue} jobs already queued")
+            if on_queued:
+                on_queued(job)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                raise QueueFull(f"{self.max_queue} jobs already queued")
+            self._jobs[job.id] = job
+            self.submitted += 1
+        self.publish(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id):
+        """job.to_dict() from this process, else from the shared store; None if unknown"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is not None:
+            return self.store.get(job_id)
+        return None
+
+    def publish(self, job):
+        """Write the job's current state to the shared store, if there is one"""
+        if self.store is not None:
+            self.store.set(job.id, job.to_dict())
+
+    def _prune(self):
+        """Drop finished jobs past their TTL, then the oldest finished ones over max_retained"""
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        for job in finished:
+            if now - job.finished_at > self.result_ttl:
+                del self._jobs[job.id]
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        for job in finished[:max(0, len(finished) - self.max_retained)]:
+            del self._jobs[job.id]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            self.publish(job)
+            try:
+                job.result, job.status_code = job.fn(job)
+                job.status = DONE if job.status_code < 400 else FAILED
+                if job.status == FAILED:
+                    job.error = (job.result or {}).get('error')
+            except Exception as e:
+                print(f"❌ Job {job.id} failed: {e}")
+                job.result, job.status_code = {'error': str(e)}, 500
+                job.status = FAILED
+                job.error = str(e)
+            job.finished_at = time.time()
+            job.fn = None  # release the closure (request data, emit target)
+            self.publish(job)
+            with self._lock:
+                if job.status == DONE:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+            return {
+                'workers': self.workers,
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'running': running,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'failed': self.failed,
+                'retained': len(self._jobs)
+            }
@@ -0,0 +1,76 @@
+import re
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z']+")
+
+# Word -> polarity weight. Tuned for short social posts; kept small on purpose.
+POSITIVE_WORDS = {
+    'amazing': 2.0, 'awesome': 2.0, 'excellent': 2.0, 'fantastic': 2.0, 'incredible': 2.0,
+    'love': 1.8, 'loving': 1.8, 'loved': 1.8, 'best': 1.6, 'perfect': 1.8, 'great': 1.5,
+    'wonderful': 1.8, 'brilliant': 1.8, 'outstanding': 1.8, 'thrilled': 1.8, 'impressed': 1.4,
+    'excited': 1.4, 'happy': 1.4, 'good': 1.0, 'nice': 1.0, 'recommend': 1.0, 'satisfied': 1.2,
+    'enjoy': 1.2, 'enjoyed': 1.2, 'beautiful': 1.4, 'glad': 1.2, 'win': 1.0, 'winning': 1.0,
+    'superb': 1.8, 'exceeded': 1.2, 'transformed': 0.8, 'changer': 1.0, 'worth': 0.8, 'thanks': 0.8
+}
+
+NEGATIVE_WORDS = {
+    'terrible': 2.0, 'awful': 2.0, 'horrible': 2.0, 'worst': 2.0, 'hate': 1.8, 'disappointing': 1.8,
+    'disappointed': 1.8, 'disaster': 1.8, 'garbage': 1.8, 'pathetic': 1.8, 'waste': 1.5,
+    'bad': 1.2, 'poor': 1.2, 'overrated': 1.4, 'frustrated': 1.4, 'regret': 1.4, 'letdown': 1.6,
+    'useless': 1.6, 'broken': 1.2, 'scam': 1.8, 'stupid': 1.6, 'avoid': 1.2, 'failed': 1.2,
+    'fail': 1.2, 'sucks': 1.6, 'annoying': 1.4, 'angry': 1.4, 'sad': 1.2, 'ugly': 1.4,
+    'idiots': 1.6, 'morons': 1.6, 'trash': 1.6, 'wrong': 0.8, 'problem': 0.6
+}
+
+NEGATIONS = {'not', 'no', 'never', "don't", 'dont', "isn't", "wasn't", "can't", 'cant', "won't", 'nothing'}
+
+
+class LexiconScorer:
+    """
+    Fast lexicon-based sentiment scorer (no network, no model download).
+    Each text becomes a sparse count vector over the lexicon vocabulary; a
+    whole batch is scored with one matrix-vector product and a logistic
+    squash into a POSITIVE/NEGATIVE probability.
+    """
+
+    def __init__(self, scale=1.2):
+        self.scale = scale
+        self.vocab = {}
+        weights = []
+        for word, weight in POSITIVE_WORDS.items():
+            self.vocab[word] = len(weights)
+            weights.append(weight)
+        for word, weight in NEGATIVE_WORDS.items():
+            self.vocab[word] = len(weights)
+            weights.append(-weight)
+        self.weights = np.array(weights, dtype=np.float32)
+
+    def _features(self, texts):
+        """Count matrix (texts x vocab); a negation flips the next lexicon hit"""
+        counts = np.zeros((len(texts), len(self.vocab)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            negate = False
+            for token in _TOKEN_RE.findall(text.lower()):
+                if token in NEGATIONS:
+                    negate = True
+                    continue
+                col = self.vocab.get(token)
+                if col is not None:
+                    counts[row, col] += -1.0 if negate else 1.0
+                    negate = False
+        return counts
+
+    def score_batch(self, texts):
+        """
+        Return [{'label', 'score'}] in the same format as the transformer
+        backends; score is the probability of the predicted label.
+        """
+        if not texts:
+            return []
+        polarity = self._features(texts) @ self.weights
+        positive_prob = 1.0 / (1.0 + np.exp(-self.scale * polarity))
+        return [
+            {'label': 'POSITIVE', 'score': float(p)} if p >= 0.5 else {'label': 'NEGATIVE', 'score': float(1.0 - p)}
+            for p in positive_prob
+        ]
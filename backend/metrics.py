@@ -0,0 +1,183 @@
+import bisect
+import math
+import threading
+import time
+
+# Seconds; covers a cached answer (ms) up to a cold LDA run or a slow fetch
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    """A metric family: one value (or histogram) per combination of label values"""
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """[(suffix, label names, label values, extra labels, value)] for the text format"""
+        with self._lock:
+            return [('', self.labelnames, key, (), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket latency histogram; observe() is a bisect and two adds under a lock"""
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, the +Inf overflow last, then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append(('_bucket', self.labelnames, key, (('le', _format_value(float(bound))),), cumulative))
+                samples.append(('_sum', self.labelnames, key, (), total))
+                samples.append(('_count', self.labelnames, key, (), cumulative))
+        return samples
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _CallbackMetric(_Metric):
+    """Values read at scrape time from fn() -> {label values tuple: value}, e.g. from existing stats()"""
+
+    def __init__(self, name, help, labelnames, fn, type):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self.type = type
+
+    def samples(self):
+        try:
+            values = self.fn() or {}
+        except Exception as e:
+            print(f"⚠️ Metric {self.name} collection failed: {e}")
+            return []
+        return [('', self.labelnames, tuple(str(v) for v in key), (), value) for key, value in values.items()]
+
+
+class MetricsRegistry:
+    """
+    In-process metrics, rendered in the Prometheus text exposition format.
+    Each process has its own registry: scrape every worker of a pre-fork
+    server separately.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, fn, labelnames=(), type='gauge'):
+        """A counter or gauge whose values fn() supplies at each scrape"""
+        return self._register(_CallbackMetric(name, help, labelnames, fn, type))
+
+    def render(self):
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, names, values, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(names, values, extra)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# The process-wide registry
+REGISTRY = MetricsRegistry()
@@ -1,66 +1,203 @@
 from gensim import corpora, models
-from transformers import pipeline
+import multiprocessing
 import requests
 import random
 import os
 import re
+import signal
+import threading
+import time
+
+# Topic-model text cleanup, compiled once
+_URL_RE = re.compile(r'http\S+|www\S+|https\S+')
+_MENTION_RE = re.compile(r'@\w+')
+_NON_ALPHA_RE = re.compile(r'[^a-z\s]')
+
+# Comprehensive stopwords list (built once, shared by every engine)
+STOPWORDS = frozenset([
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'be',
+    'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will',
+    'would', 'should', 'could', 'may', 'might', 'must', 'can', 'this',
+    'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they',
+    'them', 'their', 'what', 'which', 'who', 'when', 'where', 'why', 'how',
+    'all', 'each', 'every', 'both', 'few', 'more', 'most', 'other', 'some',
+    'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too',
+    'very', 's', 't', 'just', 'now', 'amp', 'rt', 'via'
+])
+
+
+def _load_sentiment_pipeline():
+    """Standalone DistilBERT pipeline, as text -> {'label', 'score'}"""
+    from transformers import pipeline
+    # We'll use a fast model for sentiment
+    # nlptown/bert-base-multilingual-uncased-sentiment gives 1-5 stars
+    print("Loading Sentiment Analysis model...")
+    sentiment_pipeline = pipeline(
+        "sentiment-analysis", 
+        model="distilbert-base-uncased-finetuned-sst-2-english"
+    )
+    return lambda text: sentiment_pipeline(text)[0]
+
+
+def _train_multicore(connection, corpus, dictionary, num_topics, workers, passes, iterations):
+    """Spawned trainer: LdaMulticore forks its pool from this fresh, single-threaded process"""
+    # Own process group, so stop() can kill the pool's workers along with it
+    os.setpgrp()
+    try:
+        connection.send(models.LdaMulticore(
+            corpus=corpus, num_topics=num_topics, id2word=dictionary, workers=workers,
+            passes=passes, iterations=iterations, random_state=42, eval_every=None
+        ))
+    except Exception as e:
+        print(f"⚠️ LdaMulticore training failed: {e}")
+
+
+class _MulticoreTrainer:
+    """
+    All passes in one LdaMulticore call, in a spawned process: the server
+    process is never forked, the pool starts once per run and the parent
+    can stop it at its deadline.
+    """
+
+    def __init__(self, corpus, dictionary, num_topics, workers, passes, iterations):
+        context = multiprocessing.get_context('spawn')
+        # A pipe, not a Queue: a Queue's feeder thread keeps the trainer
+        # alive until someone reads the model
+        self._connection, child_connection = context.Pipe(duplex=False)
+        self._model = None
+        # Not a daemon: daemonic processes may not start LdaMulticore's pool
+        self._process = context.Process(
+            target=_train_multicore,
+            args=(child_connection, corpus, dictionary, num_topics, workers, passes, iterations)
+        )
+        self._process.start()
+        child_connection.close()
+
+    def result(self):
+        """The trained model once the process has delivered it, else None"""
+        if self._model is None and self._connection.poll():
+            try:
+                self._model = self._connection.recv()
+            except EOFError:
+                pass  # the trainer failed without sending a model
+        return self._model
+
+    def stop(self):
+        if self._process.is_alive():
+            try:
+                os.killpg(self._process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                self._process.kill()  # killed before it made its group (and pool)
+        self._process.join()
+        self._connection.close()
+
 
 class AnalyticsEngine:
-    def __init__(self, perspective_key=None):
+    def __init__(self, perspective_key=None, sentiment_loader=None):
+        """
+        sentiment_loader returns a text -> {'label', 'score'} callable; pass
+        one backed by the app's SentimentAnalyzer to share its model. It is
+        called on first use, so topic modeling never loads a model.
+        """
         self.perspective_key = perspective_key
-        # We'll use a fast model for sentiment
-        # nlptown/bert-base-multilingual-uncased-sentiment gives 1-5 stars
-        print("Loading Sentiment Analysis model...")
-        try:
-            self.sentiment_analyzer = pipeline(
-                "sentiment-analysis", 
-                model="distilbert-base-uncased-finetuned-sst-2-english"
-            )
-        except Exception as e:
-            print(f"Error loading sentiment model: {e}")
-            self.sentiment_analyzer = None
-        
-        # Define comprehensive stopwords list
-        self.stopwords = set([
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'be',
-            'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will',
-            'would', 'should', 'could', 'may', 'might', 'must', 'can', 'this',
-            'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they',
-            'them', 'their', 'what', 'which', 'who', 'when', 'where', 'why', 'how',
-            'all', 'each', 'every', 'both', 'few', 'more', 'most', 'other', 'some',
-            'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too',
-            'very', 's', 't', 'just', 'now', 'amp', 'rt', 'via'
-        ])
+        self.stopwords = STOPWORDS
+        # batch: retrain LDA per call; online: persistent per-query models updated in place;
+        # ctfidf: class-based TF-IDF keyphrases (no LDA), optionally in TOPIC_CLUSTERS groups
+        self.topic_mode = os.getenv('TOPIC_MODE', 'batch').lower()
+        self.topic_clusters = int(os.getenv('TOPIC_CLUSTERS', 0))
+        self._topic_store = None
+        # Batch LDA: LdaMulticore workers (used from TOPIC_MULTICORE_MIN_DOCS up),
+        # most passes, and wall-clock budget per call
+        self.topic_workers = int(os.getenv('TOPIC_WORKERS', max(1, min(4, (os.cpu_count() or 1) - 1))))
+        self.multicore_min_docs = int(os.getenv('TOPIC_MULTICORE_MIN_DOCS', 1000))
+        self.max_passes = int(os.getenv('TOPIC_MAX_PASSES', 10))
+        self.time_budget = float(os.getenv('TOPIC_TIME_BUDGET', 5))
+        self._sentiment_loader = sentiment_loader or _load_sentiment_pipeline
+        self._sentiment_analyzer = None
+        self._sentiment_loaded = False
+        self._lazy_lock = threading.Lock()
+
+    @property
+    def sentiment_analyzer(self):
+        """Sentiment callable, loaded on first access (None if loading failed)"""
+        if not self._sentiment_loaded:
+            with self._lazy_lock:
+                if not self._sentiment_loaded:
+                    try:
+                        self._sentiment_analyzer = self._sentiment_loader()
+                    except Exception as e:
+                        print(f"Error loading sentiment model: {e}")
+                        self._sentiment_analyzer = None
+                    self._sentiment_loaded = True
+        return self._sentiment_analyzer
 
     def _preprocess_text(self, text):
         """Clean and preprocess text for topic modeling"""
         # Convert to lowercase
         text = text.lower()
         # Remove URLs
-        text = re.sub(r'http\S+|www\S+|https\S+', '', text)
+        text = _URL_RE.sub('', text)
         # Remove mentions
-        text = re.sub(r'@\w+', '', text)
-        # Remove hashtag symbols but keep the word
-        text = re.sub(r'#', '', text)
-        # Remove special characters and numbers
-        text = re.sub(r'[^a-z\s]', '', text)
+        text = _MENTION_RE.sub('', text)
+        # Remove special characters, numbers and hashtag symbols (keeping the word)
+        text = _NON_ALPHA_RE.sub('', text)
         # Split into words
         words = text.split()
         # Filter stopwords and short words
         words = [w for w in words if w not in self.stopwords and len(w) > 2]
         return ' '.join(words)
 
-    def perform_lda(self, cleaned_texts, num_topics=3):
+    @property
+    def topic_store(self):
+        """Per-query online topic models (TOPIC_MODE=online), created on first use"""
+        if self._topic_store is None:
+            with self._lazy_lock:
+                if self._topic_store is None:
+                    from modules.topic_store import TopicModelStore
+                    self._topic_store = TopicModelStore()
+        return self._topic_store
+
+    def _filter_tokens(self, tokens):
+        """
+        Topic words from TweetBatch tokens, cleaned like _preprocess_text:
+        hashtag words kept, digits stripped ('covid19' -> 'covid'),
+        stopwords and short words dropped
+        """
+        words = []
+        for token in tokens:
+            word = _NON_ALPHA_RE.sub('', token)
+            if len(word) > 2 and word not in self.stopwords:
+                words.append(word)
+        return words
+
+    def perform_lda(self, cleaned_texts, num_topics=3, query=None, tokens=None):
+        """
+        Topics for a list of texts. tokens (TweetBatch.tokens) skips the
+        per-text cleanup when the caller has already tokenized the tweets.
+        """
         if not cleaned_texts:
             return []
         
-        # Preprocess all texts
-        processed_texts = [self._preprocess_text(text) for text in cleaned_texts]
+        if self.topic_mode == 'ctfidf':
+            from modules.keyphrases import ctfidf_topics, terms_from_tokens, tokenize
+            if tokens is not None:
+                tokenized_terms = [terms_from_tokens(doc, self.stopwords) for doc in tokens]
+            else:
+                tokenized_terms = [tokenize(text, self.stopwords) for text in cleaned_texts]
+            return ctfidf_topics(tokenized_terms, clusters=self.topic_clusters)
         
         # Tokenize for Gensim
-        tokenized_data = [text.split() for text in processed_texts if text.strip()]
+        if tokens is not None:
+            tokenized_data = [words for words in map(self._filter_tokens, tokens) if words]
+        else:
+            processed_texts = [self._preprocess_text(text) for text in cleaned_texts]
+            tokenized_data = [text.split() for text in processed_texts if text.strip()]
         if not tokenized_data: return []
+        
+        # Online mode: fold only the unseen tweets into the query's saved model
+        if self.topic_mode == 'online' and query:
+            return self.topic_store.update(query.strip().lower(), tokenized_data, num_topics=num_topics)
 
         dictionary = corpora.Dictionary(tokenized_data)
         # Filter extremes to remove very rare and very common words
@@ -70,20 +207,62 @@ class AnalyticsEngine:
         if not corpus or not any(corpus):
             return []
         
-        # Simple LDA
-        lda_model = models.LdaModel(corpus, num_topics=num_topics, id2word=dictionary, passes=10, random_state=42)
+        lda_model = self._train_lda(corpus, dictionary, num_topics)
         
-        topics = []
-        for idx, topic in lda_model.print_topics(-1):
-            topics.append({"id": idx, "words": topic})
-        return topics
+        return [
+            {"id": idx, "terms": [{"word": word, "weight": round(float(weight), 4)} for word, weight in terms]}
+            for idx, terms in lda_model.show_topics(num_topics=-1, num_words=10, formatted=False)
+        ]
+
+    def _lda_schedule(self, num_docs):
+        """
+        Passes and per-document iterations for a corpus size: small fetches
+        get the full 10 passes, large ones fewer, since each pass already
+        sees enough documents (about 5000 document-passes in total)
+        """
+        passes = max(1, min(self.max_passes, round(5000 / num_docs)))
+        iterations = 50 if num_docs <= 1000 else 25
+        return passes, iterations
+
+    def _train_lda(self, corpus, dictionary, num_topics):
+        """
+        Train LDA one pass at a time and stop early when the next pass would
+        overrun TOPIC_TIME_BUDGET, returning the model trained so far.
+        Large corpora also train with LdaMulticore in a spawned process;
+        its model is used if it finishes first.
+        """
+        passes, iterations = self._lda_schedule(len(corpus))
+        trainer = None
+        if self.topic_workers > 1 and len(corpus) >= self.multicore_min_docs:
+            trainer = _MulticoreTrainer(corpus, dictionary, num_topics, self.topic_workers, passes, iterations)
+        
+        try:
+            lda_model = models.LdaModel(
+                num_topics=num_topics, id2word=dictionary,
+                passes=1, iterations=iterations, random_state=42, eval_every=None
+            )
+            start = time.time()
+            for done in range(1, passes + 1):
+                lda_model.update(corpus)
+                elapsed = time.time() - start
+                if trainer and trainer.result():
+                    print(f"⚡ LdaMulticore finished first ({elapsed:.2f}s, {done}/{passes} single-process passes)")
+                    return trainer.result()
+                if done < passes and elapsed + elapsed / done > self.time_budget:
+                    print(f"⏱️ LDA stopped after {done}/{passes} passes ({elapsed:.2f}s budget {self.time_budget}s)")
+                    break
+            return lda_model
+        finally:
+            if trainer:
+                trainer.stop()
 
     def analyze_sentiment(self, text):
-        if not self.sentiment_analyzer:
+        sentiment_analyzer = self.sentiment_analyzer
+        if not sentiment_analyzer:
             return {"label": "NEUTRAL", "score": 0.5}
             
         try:
-            result = self.sentiment_analyzer(text)[0]
+            result = sentiment_analyzer(text)
             # SST-2 returns POSITIVE/NEGATIVE
             return {"label": result['label'], "score": result['score']}
         except:
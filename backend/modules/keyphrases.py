@@ -0,0 +1,154 @@
+from scipy import sparse
+import numpy as np
+import re
+
+_URL_RE = re.compile(r'http\S+|www\S+|https\S+')
+_MENTION_RE = re.compile(r'@\w+')
+_TOKEN_RE = re.compile(r'#[a-z0-9_]+|[a-z]+')
+_DIGITS_RE = re.compile(r'[0-9]+')
+
+
+def tokenize(text, stopwords):
+    """
+    Unigrams, bigrams and hashtags of a tweet. Words are lowercase letters
+    only (3+ chars, no stopwords); bigrams join adjacent kept words and
+    hashtags keep their '#'.
+    """
+    text = _MENTION_RE.sub(' ', _URL_RE.sub(' ', text.lower()))
+    return terms_from_tokens(_TOKEN_RE.findall(text), stopwords)
+
+
+def terms_from_tokens(tokens, stopwords):
+    """
+    tokenize() over already split lowercase tokens (e.g. TweetBatch.tokens).
+    Digits are stripped from words ('covid19' -> 'covid'), as tokenize() skips them.
+    """
+    terms = []
+    previous = None
+    for token in tokens:
+        if token.startswith('#'):
+            if len(token) > 2:
+                terms.append(token)
+            previous = None
+            continue
+        token = _DIGITS_RE.sub('', token)
+        if len(token) <= 2 or token in stopwords or not token.isalpha():
+            previous = None
+            continue
+        terms.append(token)
+        if previous:
+            terms.append(f"{previous} {token}")
+        previous = token
+    return terms
+
+
+def _term_matrix(tokenized_docs, no_below=2, no_above=0.5):
+    """Sparse doc-term count matrix and its vocabulary, with rare/ubiquitous terms dropped"""
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    for terms in tokenized_docs:
+        for term in terms:
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+        indptr.append(len(indices))
+    counts = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+        shape=(len(tokenized_docs), len(vocabulary))
+    )
+    counts.sum_duplicates()
+
+    doc_freq = np.diff(counts.tocsc().indptr)
+    keep = np.flatnonzero((doc_freq >= no_below) & (doc_freq <= no_above * len(tokenized_docs)))
+    terms = np.array(list(vocabulary), dtype=object)[keep]
+    return counts[:, keep].tocsr(), terms
+
+
+def _spherical_kmeans(rows, k, iterations=10, seed=42):
+    """Cluster L2-normalized sparse rows by cosine similarity; returns a label per row"""
+    rng = np.random.RandomState(seed)
+    n = rows.shape[0]
+    # k-means++ style seeding on cosine distance
+    centers = [rng.randint(n)]
+    best = np.zeros(n)
+    for _ in range(1, k):
+        best = np.maximum(best, (rows @ rows[centers[-1]].T).toarray().ravel())
+        distance = np.clip(1.0 - best, 0.0, None)
+        if distance.sum() == 0:
+            break
+        centers.append(rng.choice(n, p=distance / distance.sum()))
+    centroids = rows[centers].toarray()
+
+    labels = np.zeros(n, dtype=np.int64)
+    for iteration in range(iterations):
+        new_labels = np.asarray((rows @ centroids.T).argmax(axis=1)).ravel()
+        if iteration and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        membership = sparse.csr_matrix(
+            (np.ones(n), (labels, np.arange(n))), shape=(len(centroids), n)
+        )
+        centroids = np.asarray((membership @ rows).todense())
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids /= norms
+    return labels
+
+
+def ctfidf_topics(tokenized_docs, clusters=0, top_n=10):
+    """
+    Class-based TF-IDF keyphrases. With clusters > 1, documents are grouped
+    into that many clusters by spherical k-means on their TF-IDF vectors
+    and each cluster is a class; otherwise the whole fetch is one class.
+    A term's weight in a class is tf(t, c) * log(1 + A / f(t)), where A is
+    the average number of terms per class and f(t) the term's frequency
+    across all classes. A single class has nothing to contrast with, so
+    its weights are tf(t) * log(N / df(t)) over the N documents instead.
+
+    Returns [{"id", "terms": [{"word", "weight"}]}], largest class first.
+    """
+    counts, terms = _term_matrix(tokenized_docs)
+    if counts.shape[1] == 0:
+        return []
+    nonempty = np.flatnonzero(np.diff(counts.indptr))
+    counts = counts[nonempty]
+    n_docs = counts.shape[0]
+    doc_freq = np.diff(counts.tocsc().indptr)
+
+    if clusters > 1 and n_docs > clusters:
+        idf = np.log(n_docs / doc_freq).astype(np.float32) + 1.0
+        tfidf = counts @ sparse.diags(idf)
+        norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+        tfidf = sparse.diags(1.0 / norms) @ tfidf
+        labels = _spherical_kmeans(tfidf.tocsr(), clusters)
+    else:
+        labels = np.zeros(n_docs, dtype=np.int64)
+
+    n_classes = labels.max() + 1
+    membership = sparse.csr_matrix((np.ones(n_docs), (labels, np.arange(n_docs))), shape=(n_classes, n_docs))
+    class_tf = np.asarray((membership @ counts).todense())
+    class_sizes = np.asarray(membership.sum(axis=1)).ravel()
+
+    if n_classes == 1:
+        # With one class, f(t) is tf(t) and the weight would only grow with the
+        # count: weigh against document frequency, so terms in nearly every
+        # tweet rank below more specific ones
+        weights = class_tf * np.log(n_docs / doc_freq)
+    else:
+        average_words = class_tf.sum() / n_classes
+        weights = class_tf * np.log(1.0 + average_words / class_tf.sum(axis=0))
+    # Scale rows so each class's weights sum to 1, like topic-word probabilities
+    totals = weights.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    weights /= totals
+
+    topics = []
+    for class_id in np.argsort(-class_sizes, kind='stable'):
+        if class_sizes[class_id] == 0:
+            continue
+        row = weights[class_id]
+        top = [index for index in np.argsort(-row, kind='stable')[:top_n] if row[index] > 0]
+        topics.append({
+            "id": int(class_id),
+            "terms": [{"word": str(terms[index]), "weight": round(float(row[index]), 4)} for index in top]
+        })
+    return topics
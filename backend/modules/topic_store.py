@@ -0,0 +1,235 @@
+from gensim import models
+from gensim.corpora import HashDictionary
+from collections import OrderedDict
+import numpy as np
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+# Bump when the on-disk layout changes; older snapshots are retrained from scratch
+FORMAT_VERSION = 1
+
+
+class OnlineTopicModel:
+    """
+    Persistent topic model for one query, trained incrementally.
+
+    Words map to a fixed id space with the hashing trick (HashDictionary),
+    so the vocabulary grows without resizing the model, and memory stays
+    bounded by vocab_size x num_topics however much text is seen. Each
+    update() feeds only documents not seen before to gensim's online
+    LdaModel.update, so a refresh costs time proportional to the new tweets.
+    """
+
+    def __init__(self, num_topics=5, vocab_size=2 ** 16, passes=2, seen_limit=50000):
+        self.num_topics = num_topics
+        self.vocab_size = vocab_size
+        self.passes = passes
+        self.seen_limit = seen_limit
+        self.dictionary = HashDictionary(id_range=vocab_size, debug=False)
+        self.lda = None
+        self.version = 0
+        self.documents = 0
+        # Display word and document frequency per hashed id (first word seen wins)
+        self.id2word = {}
+        self.doc_freq = np.zeros(vocab_size, dtype=np.int64)
+        # Hashes of documents already trained on, oldest first
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _new_documents(self, tokenized_docs):
+        """Skip documents already trained on (e.g. the same tweet fetched again)"""
+        fresh = []
+        for tokens in tokenized_docs:
+            digest = hashlib.sha1(' '.join(tokens).encode('utf-8')).hexdigest()[:16]
+            if digest in self.seen:
+                continue
+            self.seen[digest] = None
+            fresh.append(tokens)
+        while len(self.seen) > self.seen_limit:
+            self.seen.popitem(last=False)
+        return fresh
+
+    def update(self, tokenized_docs):
+        """Train on the unseen documents; returns how many were new"""
+        with self.lock:
+            fresh = self._new_documents(tokenized_docs)
+            if not fresh:
+                return 0
+
+            corpus = []
+            for tokens in fresh:
+                for token in set(tokens):
+                    token_id = self.dictionary.restricted_hash(token)
+                    self.id2word.setdefault(token_id, token)
+                    self.doc_freq[token_id] += 1
+                corpus.append(self.dictionary.doc2bow(tokens))
+            self.documents += len(fresh)
+
+            if self.lda is None:
+                self.lda = models.LdaModel(
+                    num_topics=self.num_topics, id2word=self.dictionary, random_state=42,
+                    eval_every=None  # skip the perplexity estimate on every update
+                )
+            self.lda.update(corpus, passes=self.passes)
+            self.version += 1
+            return len(fresh)
+
+    def topics(self, topn=10):
+        """
+        [{"id", "terms": [{"word", "weight"}]}], as in batch mode. Like the batch
+        mode's filter_extremes, words in fewer than 2 documents or in more
+        than half of them are left out. Probabilities are renormalized over
+        the kept words, since the prior spreads mass over every unused hash id.
+        """
+        with self.lock:
+            if self.lda is None:
+                return []
+            keep = (self.doc_freq >= 2) & (self.doc_freq <= 0.5 * self.documents)
+            if not keep.any():
+                return []
+            weights = self.lda.get_topics() * keep
+            weights /= weights.sum(axis=1, keepdims=True)
+            topics = []
+            for idx, row in enumerate(weights):
+                top_ids = np.argsort(row)[::-1][:min(topn, int(keep.sum()))]
+                topics.append({
+                    "id": idx,
+                    "terms": [
+                        {"word": self.id2word[token_id], "weight": round(float(row[token_id]), 4)}
+                        for token_id in top_ids
+                    ]
+                })
+            return topics
+
+    def save(self, directory):
+        """
+        Write snapshot v<version> under directory, then point meta.json at it
+        (atomic rename), so a crash mid-save leaves the previous version
+        loadable. Older snapshots are removed.
+        """
+        with self.lock:
+            if self.lda is None:
+                return
+            os.makedirs(directory, exist_ok=True)
+            snapshot = os.path.join(directory, f"v{self.version}")
+            os.makedirs(snapshot, exist_ok=True)
+            self.lda.save(os.path.join(snapshot, 'lda'))
+            np.save(os.path.join(snapshot, 'doc_freq.npy'), self.doc_freq)
+            with open(os.path.join(snapshot, 'state.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'documents': self.documents,
+                    'id2word': self.id2word,
+                    'seen': list(self.seen)
+                }, f)
+
+            meta = {
+                'format': FORMAT_VERSION,
+                'version': self.version,
+                'num_topics': self.num_topics,
+                'vocab_size': self.vocab_size
+            }
+            tmp_path = os.path.join(directory, 'meta.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+            for name in os.listdir(directory):
+                if re.fullmatch(r'v\d+', name) and name != f"v{self.version}":
+                    shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory, num_topics=5, vocab_size=2 ** 16, passes=2, seen_limit=50000):
+        """
+        The latest snapshot in directory, or None if there is none or it was
+        written with another format/num_topics/vocab_size
+        """
+        try:
+            with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (meta.get('format') != FORMAT_VERSION or meta.get('num_topics') != num_topics
+                or meta.get('vocab_size') != vocab_size):
+            print(f"⚠️ Topic model at {directory} has an incompatible layout - retraining")
+            return None
+
+        snapshot = os.path.join(directory, f"v{meta['version']}")
+        model = cls(num_topics, vocab_size, passes, seen_limit)
+        model.lda = models.LdaModel.load(os.path.join(snapshot, 'lda'))
+        model.doc_freq = np.load(os.path.join(snapshot, 'doc_freq.npy'))
+        with open(os.path.join(snapshot, 'state.json'), encoding='utf-8') as f:
+            state = json.load(f)
+        model.documents = state['documents']
+        model.id2word = {int(token_id): word for token_id, word in state['id2word'].items()}
+        model.seen = OrderedDict.fromkeys(state['seen'])
+        model.version = meta['version']
+        return model
+
+
+class TopicModelStore:
+    """
+    One OnlineTopicModel per (query, num_topics), saved under base_dir and
+    kept in an LRU of at most max_models in memory (evicted models reload
+    from disk).
+    """
+
+    def __init__(self, base_dir=None, vocab_size=None, passes=None, max_models=None, seen_limit=None):
+        self.base_dir = base_dir or os.getenv('TOPIC_MODEL_DIR', os.path.join('models', 'topics'))
+        self.vocab_size = int(vocab_size or os.getenv('TOPIC_VOCAB_SIZE', 2 ** 16))
+        self.passes = int(passes or os.getenv('TOPIC_ONLINE_PASSES', 2))
+        self.max_models = int(max_models or os.getenv('TOPIC_MAX_MODELS', 16))
+        self.seen_limit = int(seen_limit or os.getenv('TOPIC_SEEN_LIMIT', 50000))
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _directory(self, key, num_topics):
+        """Filesystem-safe directory name for a query"""
+        slug = re.sub(r'[^a-z0-9]+', '-', key.lower()).strip('-')[:40]
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.base_dir, f"{slug}-{digest}-k{num_topics}")
+
+    def get(self, key, num_topics=5):
+        """The model for key: from memory, else from disk, else a new one"""
+        with self._lock:
+            model = self._models.get((key, num_topics))
+            if model is not None:
+                self._models.move_to_end((key, num_topics))
+                return model
+
+            model = None
+            try:
+                model = OnlineTopicModel.load(
+                    self._directory(key, num_topics), num_topics, self.vocab_size, self.passes, self.seen_limit
+                )
+            except Exception as e:
+                print(f"⚠️ Could not load topic model for '{key}': {e} - retraining")
+            if model is None:
+                model = OnlineTopicModel(num_topics, self.vocab_size, self.passes, self.seen_limit)
+
+            self._models[(key, num_topics)] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            return model
+
+    def update(self, key, tokenized_docs, num_topics=5, topn=10):
+        """Train key's model on new documents, persist it, and return its topics"""
+        model = self.get(key, num_topics)
+        if model.update(tokenized_docs):
+            try:
+                model.save(self._directory(key, num_topics))
+            except Exception as e:
+                print(f"⚠️ Could not save topic model for '{key}': {e}")
+        return model.topics(topn=topn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'models_in_memory': len(self._models),
+                'max_models': self.max_models,
+                'vocab_size': self.vocab_size,
+                'versions': {f"{key}:{k}": model.version for (key, k), model in self._models.items()}
+            }
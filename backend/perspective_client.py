@@ -0,0 +1,171 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_URL = 'https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze'
+
+DEFAULT_ATTRIBUTES = ('TOXICITY', 'SEVERE_TOXICITY', 'IDENTITY_ATTACK', 'INSULT', 'PROFANITY', 'THREAT')
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `burst` saved"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting up to timeout seconds; False if none came"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class PerspectiveClient:
+    """
+    Concurrent Perspective API client: one pooled HTTP session shared by a
+    thread pool, a token bucket matching the quota, retries with
+    exponential backoff on 429/5xx, and a per-call fallback (the keyword
+    detector) on timeouts or exhausted retries.
+    """
+
+    def __init__(self, api_key, fallback, api_url=None, attributes=DEFAULT_ATTRIBUTES,
+                 qps=None, burst=None, workers=None, timeout=None, max_retries=None, max_wait=None):
+        self.api_key = api_key
+        self.fallback = fallback
+        self.api_url = api_url or os.getenv('PERSPECTIVE_API_URL', DEFAULT_API_URL)
+        self.attributes = tuple(attributes)
+        self.timeout = float(timeout or os.getenv('PERSPECTIVE_TIMEOUT', 5))
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv('PERSPECTIVE_MAX_RETRIES', 3))
+        # Longest a call waits for a rate-limit token before falling back
+        self.max_wait = float(max_wait or os.getenv('PERSPECTIVE_MAX_WAIT', 30))
+
+        workers = int(workers or os.getenv('PERSPECTIVE_WORKERS', 8))
+        self.bucket = TokenBucket(
+            rate=float(qps or os.getenv('PERSPECTIVE_QPS', 1)),
+            burst=float(burst or os.getenv('PERSPECTIVE_BURST', 1))
+        )
+
+        # Persistent keep-alive connections, one per worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='perspective')
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.fallbacks = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _backoff(self, attempt, response=None):
+        """
+        Seconds to wait before a retry: Retry-After if given (uncapped; the
+        caller falls back when it exceeds max_wait), else exponential with jitter
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        return min(0.5 * (2 ** attempt), 8.0) * (0.5 + random.random() / 2)
+
+    def request_scores(self, text, deadline=None):
+        """
+        Raw attributeScores for one text. Raises on timeouts, non-retryable
+        errors, when retries are exhausted or once deadline (a time.time()
+        value) has passed, so a caller's time budget bounds the whole call.
+        """
+        payload = {
+            'comment': {'text': text[:20000]},  # API limit
+            'languages': ['en'],
+            'requestedAttributes': {attribute: {} for attribute in self.attributes}
+        }
+
+        def remaining(limit):
+            if deadline is None:
+                return limit
+            left = deadline - time.time()
+            if left <= 0:
+                raise TimeoutError("caller deadline passed")
+            return min(limit, left)
+
+        for attempt in range(self.max_retries + 1):
+            if not self.bucket.acquire(timeout=remaining(self.max_wait)):
+                raise TimeoutError("rate limiter wait exceeded")
+
+            self._count('calls')
+            response = self.session.post(
+                self.api_url, params={'key': self.api_key}, json=payload, timeout=remaining(self.timeout)
+            )
+            if response.status_code == 200:
+                return response.json().get('attributeScores', {})
+
+            retryable = response.status_code == 429 or response.status_code >= 500
+            if not retryable or attempt == self.max_retries:
+                raise RuntimeError(f"Perspective API error: {response.status_code}")
+
+            self._count('retries')
+            backoff = self._backoff(attempt, response)
+            if backoff > self.max_wait:
+                # Don't park a pool thread for as long as the server asks (e.g. an hour)
+                raise TimeoutError(f"Retry-After {backoff:.0f}s exceeds max wait {self.max_wait:.0f}s")
+            if deadline is not None and time.time() + backoff >= deadline:
+                raise TimeoutError("caller deadline passed")
+            time.sleep(backoff)
+
+    def analyze(self, text, formatter, deadline=None):
+        """
+        (formatter(scores), True) for one text, or (fallback result, False)
+        on any failure, so callers can tell real model scores apart
+        """
+        try:
+            return formatter(self.request_scores(text, deadline)), True
+        except Exception as e:
+            print(f"⚠️ Perspective API call failed ({e}) - Using fallback detection")
+            self._count('fallbacks')
+            return self.fallback(text), False
+
+    def analyze_batch(self, texts, formatter, deadline=None):
+        """
+        Concurrent analyze() over texts; results keep the input order. Texts
+        not scored by deadline get the fallback, so no call outlives it.
+        """
+        return list(self.executor.map(lambda text: self.analyze(text, formatter, deadline), texts))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'fallbacks': self.fallbacks,
+                'qps': self.bucket.rate,
+                'burst': self.bucket.burst
+            }
@@ -0,0 +1,149 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DONE = 'done'
+FAILED = 'failed'
+TIMED_OUT = 'timed_out'
+
+
+class Stage:
+    """
+    One step of the analysis DAG. fn receives a dict with the results of
+    its dependencies (and, with deadline_aware, the time.time() deadline
+    it must finish by, or None); fallback(error) supplies the result used
+    downstream when the stage fails or times out.
+    """
+
+    def __init__(self, name, fn, deps=(), fallback=None, timeout=None, deadline_aware=False):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.fallback = fallback
+        self.timeout = timeout
+        self.deadline_aware = deadline_aware
+
+
+class _Attempt:
+    """One submitted stage; started is set by the pool thread when fn begins"""
+    __slots__ = ('stage', 'timeout', 'started', 'deadline')
+
+    def __init__(self, stage, timeout):
+        self.stage = stage
+        self.timeout = timeout
+        self.started = None
+        self.deadline = None
+
+    def __call__(self, inputs):
+        # The timeout counts from here, not from submission: time spent
+        # queued behind other requests' stages is not the stage's fault
+        self.started = time.time()
+        self.deadline = self.started + self.timeout if self.timeout else None
+        if self.stage.deadline_aware:
+            return self.stage.fn(inputs, self.deadline)
+        return self.stage.fn(inputs)
+
+
+class StageDAG:
+    """
+    Runs stages on a shared thread pool as soon as their dependencies have
+    settled, so independent stages overlap and end-to-end latency tends to
+    the slowest path instead of the sum. A failed or timed-out stage is
+    replaced by its fallback and never blocks the others. A stage's timeout
+    runs from when it starts on a pool thread; a timed-out stage's thread
+    cannot be interrupted and finishes in the background, so long stages
+    should be deadline_aware and stop early.
+    """
+
+    # How often to check whether queued stages have started (their deadlines are unknown until then)
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, stages, executor, default_timeout=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.executor = executor
+        self.default_timeout = default_timeout
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    def run(self, on_complete=None):
+        """
+        Run every stage; returns (results, report) where report maps each
+        stage to {'status', 'seconds', 'error'}. on_complete(name, report,
+        settled_count) is called as each stage settles.
+        """
+        results = {}
+        report = {}
+        pending = dict(self.stages)
+        running = {}  # future -> (attempt, submitted)
+
+        def settle(stage, status, value, started, error=None):
+            if status != DONE:
+                print(f"⚠️ Stage '{stage.name}' {status}: {error}")
+                value = stage.fallback(error) if stage.fallback else None
+            results[stage.name] = value
+            report[stage.name] = {
+                'status': status,
+                'seconds': round(time.time() - started, 3),
+                'error': None if error is None else str(error)
+            }
+            if on_complete:
+                try:
+                    on_complete(stage.name, report[stage.name], len(report))
+                except Exception as e:
+                    print(f"⚠️ Stage completion callback failed: {e}")
+
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.deps):
+                    del pending[name]
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    timeout = stage.timeout if stage.timeout is not None else self.default_timeout
+                    attempt = _Attempt(stage, timeout)
+                    running[self.executor.submit(attempt, inputs)] = (attempt, time.time())
+
+            if not running:
+                break  # Nothing runnable left (a cycle); unreachable with valid deps
+
+            waits = []
+            for attempt, _ in running.values():
+                if attempt.deadline is not None:
+                    waits.append(attempt.deadline - time.time())
+                elif attempt.timeout and attempt.started is None:
+                    waits.append(self.POLL_INTERVAL)
+            wait_for = max(0.0, min(waits)) if waits else None
+            done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                attempt, submitted = running.pop(future)
+                try:
+                    settle(attempt.stage, DONE, future.result(), attempt.started or submitted)
+                except Exception as e:
+                    settle(attempt.stage, FAILED, None, attempt.started or submitted, e)
+
+            now = time.time()
+            for future, (attempt, submitted) in list(running.items()):
+                if attempt.deadline is not None and now >= attempt.deadline:
+                    del running[future]
+                    future.cancel()  # no-op once running; the stage's deadline_aware fn stops early
+                    settle(attempt.stage, TIMED_OUT, None, attempt.started,
+                           TimeoutError(f"exceeded {attempt.timeout:.1f}s"))
+
+        return results, report
+
+
+def _default_workers():
+    # At most 3 stages of one request run at once (sentiment, toxicity and
+    # topics); requests in flight are the job workers plus concurrent
+    # synchronous requests, so none of them has to queue for a thread
+    requests = int(os.getenv('JOB_WORKERS', 4)) + int(os.getenv('PIPELINE_SYNC_REQUESTS', 4))
+    return 3 * requests
+
+
+# Shared by all requests; stages mostly wait on the inference scheduler,
+# the Perspective pool or gensim, so threads are enough
+EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PIPELINE_WORKERS', 0)) or _default_workers(),
+    thread_name_prefix='pipeline-stage'
+)
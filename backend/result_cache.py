@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Normalize text for cache keys (case and whitespace insensitive)"""
+    return _WHITESPACE_RE.sub(' ', text or '').strip().lower()
+
+
+def make_key(text, model_id):
+    """Content-addressed key: hash of the model id plus the normalized text"""
+    payload = f"{model_id}\x00{normalize_text(text)}".encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ResultCache:
+    """
+    Bounded in-memory LRU cache with an optional persistent SQLite tier.
+    Values must be JSON serializable. With a ttl (seconds), entries expire
+    in both tiers.
+    """
+
+    def __init__(self, max_entries=10000, path=None, table='results', ttl=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        if path:
+            self._connect()
+            # SQLite connections must not be used across fork(): pre-fork
+            # server workers (gunicorn.conf.py) each open their own
+            os.register_at_fork(after_in_child=self._reopen_after_fork)
+
+    def _connect(self):
+        path, table = self.path, self.table
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                f"(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            # Tables created before TTL support lack the expiry column
+            columns = [row[1] for row in self._db.execute(f"PRAGMA table_info({table})")]
+            if 'expires_at' not in columns:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN expires_at REAL")
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)")
+            self._db.commit()
+            print(f"✅ Result cache persisted to {path} ({table})")
+        except Exception as e:
+            print(f"⚠️ Could not open result cache at {path}: {e} - using memory only")
+            self._db = None
+
+    def _reopen_after_fork(self):
+        # Keep the parent's connection referenced but unused: closing it in
+        # the child would release locks the parent still holds
+        self._inherited_db = self._db
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _remember(self, key, value, expires_at=None):
+        """Insert into the LRU tier, evicting the least recently used entry"""
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys found in either tier"""
+        found = {}
+        now = time.time()
+        with self._lock:
+            missing = []
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is not None and entry[1] is not None and entry[1] <= now:
+                    del self._memory[key]
+                    self.expired += 1
+                    entry = None
+                if entry is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+
+            if missing and self._db is not None:
+                unique_missing = list(dict.fromkeys(missing))
+                try:
+                    # Stay below SQLite's bound-parameter limit
+                    for i in range(0, len(unique_missing), 500):
+                        chunk = unique_missing[i:i + 500]
+                        placeholders = ','.join('?' * len(chunk))
+                        rows = self._db.execute(
+                            f"SELECT key, value, expires_at FROM {self.table} "
+                            f"WHERE key IN ({placeholders}) AND (expires_at IS NULL OR expires_at > ?)",
+                            chunk + [now]
+                        ).fetchall()
+                        for key, value, expires_at in rows:
+                            found[key] = json.loads(value)
+                            self._remember(key, found[key], expires_at)
+                            self.disk_hits += 1
+                except Exception as e:
+                    print(f"⚠️ Result cache read error: {e}")
+
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items):
+        """Store a {key: value} mapping in both tiers"""
+        if not items:
+            return
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            for key, value in items.items():
+                self._remember(key, value, expires_at)
+
+            if self._db is not None:
+                try:
+                    self._db.executemany(
+                        f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                        [(key, json.dumps(value), expires_at) for key, value in items.items()]
+                    )
+                    # Drop expired rows so the persistent tier stays bounded by the TTL
+                    if expires_at is not None:
+                        self._db.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+                    self._db.commit()
+                except Exception as e:
+                    print(f"⚠️ Result cache write error: {e}")
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def stats(self):
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'persistent': self._db is not None
+            }
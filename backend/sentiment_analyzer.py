@@ -1,20 +1,62 @@
-from transformers import pipeline
-import torch
+import math
+import os
+import re
+
+from lexicon_scorer import LexiconScorer
+from result_cache import ResultCache, make_key
+from sentiment_backends import MODEL_NAME, create_backend
+
+# The pieces BERT's basic tokenizer splits text into before WordPiece: words and single punctuation/symbols
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
 
 class SentimentAnalyzer:
-    def __init__(self):
+    def __init__(self, batch_size=None, token_budget=None, backend=None):
         print("🧠 Loading sentiment analysis model (this takes 30-60 seconds first time)...")
         
+        # Dynamic batching limits: max texts per batch and max padded tokens per batch
+        self.batch_size = int(batch_size or os.getenv('SENTIMENT_BATCH_SIZE', 32))
+        self.token_budget = int(token_budget or os.getenv('SENTIMENT_TOKEN_BUDGET', 4096))
+        self.last_batch_stats = {}
+        
+        # Inference backend: torch (default), onnx or onnx-int8
+        self.backend_name = (backend or os.getenv('SENTIMENT_BACKEND', 'torch')).lower()
+        
+        # Optional process-pool mode: N workers, each with its own model copy
+        self.workers = int(os.getenv('SENTIMENT_WORKERS', 0))
+        self.threads_per_worker = int(os.getenv('SENTIMENT_THREADS_PER_WORKER', 0)) or None
+        
+        # Confidence cascade: a lexicon scorer decides clear-cut texts and only
+        # texts whose lexicon probability falls inside (low, high) reach the model
+        self.mode = os.getenv('SENTIMENT_MODE', 'transformer').lower()
+        self.cascade_low = float(os.getenv('SENTIMENT_CASCADE_LOW', 0.1))
+        self.cascade_high = float(os.getenv('SENTIMENT_CASCADE_HIGH', 0.9))
+        self.lexicon = LexiconScorer() if self.mode == 'cascade' else None
+        self.last_cascade_stats = {}
+        self.errors = 0  # batches that fell back to NEUTRAL after a model error
+        
+        # Content-addressed result cache (SENTIMENT_CACHE_SIZE=0 disables it).
+        # The backend (and cascade mode) is part of the model id since their scores differ.
+        self.model_id = f"{MODEL_NAME}:{self.backend_name}"
+        if self.lexicon:
+            self.model_id += f":cascade({self.cascade_low},{self.cascade_high})"
+        cache_size = int(os.getenv('SENTIMENT_CACHE_SIZE', 10000))
+        self.cache = ResultCache(
+            max_entries=cache_size,
+            path=os.getenv('SENTIMENT_CACHE_PATH') or None,
+            table='sentiment'
+        ) if cache_size > 0 else None
+        
         try:
             # Use smaller, faster model
-            self.analyzer = pipeline(
-                "sentiment-analysis",
-                model="distilbert-base-uncased-finetuned-sst-2-english",
-                device=0 if torch.cuda.is_available() else -1,
-                truncation=True,
-                max_length=512
-            )
-            print("✅ Sentiment analyzer ready (model cached for future use)")
+            if self.workers > 1:
+                from sentiment_pool import ShardedSentimentPool
+                self.analyzer = ShardedSentimentPool(
+                    self.backend_name, MODEL_NAME, self.workers, self.threads_per_worker
+                )
+            else:
+                self.analyzer = create_backend(self.backend_name, MODEL_NAME)
+            print(f"✅ Sentiment analyzer ready ({self.backend_name} backend, model cached for future use)")
+            print(f"   Batching: batch_size={self.batch_size}, token_budget={self.token_budget}")
         except Exception as e:
             print(f"❌ Failed to load sentiment model: {e}")
             self.analyzer = None
@@ -24,61 +66,271 @@ class SentimentAnalyzer:
         if not self.analyzer:
             return {'sentiment': 'NEUTRAL', 'confidence': 0.0}
         
-        try:
-            result = self.analyzer(text[:512])[0]
-            sentiment = result['label']
-            confidence = round(result['score'], 4)
-            
-            # If confidence is low (< 0.65), classify as NEUTRAL
-            if confidence < 0.65:
-                sentiment = 'NEUTRAL'
+        return self.analyze_batch([text])[0]
+    
+    def _format_result(self, result):
+        """Convert a raw pipeline prediction into our response format"""
+        sentiment = result['label']
+        confidence = round(result['score'], 4)
+        
+        # If confidence is low (< 0.65), classify as NEUTRAL
+        if confidence < 0.65:
+            sentiment = 'NEUTRAL'
+        
+        return {
+            'sentiment': sentiment,
+            'confidence': confidence
+        }
+    
+    def _token_lengths(self, texts):
+        """
+        Estimated token length of each text, for bucketing only: its word and
+        punctuation pieces plus [CLS]/[SEP]. Running the tokenizer here would
+        tokenize every text twice, as the backend tokenizes it again. Words
+        WordPiece splits further are counted once, so batches can run a bit
+        over token_budget; the sort order is barely affected.
+        """
+        return [min(512, len(_PIECE_RE.findall(text)) + 2) for text in texts]
+    
+    def _make_buckets(self, lengths, max_batch=None):
+        """
+        Group text indices into length-sorted buckets.
+        A bucket is closed when it reaches max_batch (default batch_size) texts
+        or when padding every text to the bucket's longest one would exceed
+        token_budget.
+        """
+        max_batch = max_batch or self.batch_size
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        buckets = []
+        current = []
+        for idx in order:
+            # Sorted ascending, so the new text is the longest in the bucket
+            padded_cost = (len(current) + 1) * lengths[idx]
+            if current and (len(current) >= max_batch or padded_cost > self.token_budget):
+                buckets.append(current)
+                current = []
+            current.append(idx)
+        if current:
+            buckets.append(current)
+        return buckets
+    
+    def get_batching_stats(self):
+        """Batching configuration and stats of the last analyze_batch call"""
+        return {
+            'backend': self.backend_name,
+            'workers': self.workers,
+            'batch_size': self.batch_size,
+            'token_budget': self.token_budget,
+            **self.last_batch_stats,
+            'mode': self.mode,
+            **({'cascade': {'low': self.cascade_low, 'high': self.cascade_high, **self.last_cascade_stats}}
+               if self.lexicon else {})
+        }
+    
+    def _infer_batch(self, texts, on_batch=None):
+        """
+        Score texts with the configured mode. In cascade mode the lexicon
+        scorer decides confident texts and only the rest reach the model;
+        every result is tagged with the tier that decided it.
+        """
+        if not self.lexicon:
+            return self._infer_transformer(texts, on_batch)
+        
+        results = [None] * len(texts)
+        escalated = []
+        for i, prediction in enumerate(self.lexicon.score_batch(texts)):
+            positive_prob = prediction['score'] if prediction['label'] == 'POSITIVE' else 1.0 - prediction['score']
+            if self.cascade_low < positive_prob < self.cascade_high:
+                escalated.append(i)
+            else:
+                results[i] = {**self._format_result(prediction), 'tier': 'lexicon'}
+        
+        decided = [i for i in range(len(texts)) if results[i] is not None]
+        if on_batch and decided:
+            on_batch(decided, [results[i] for i in decided])
+        
+        if escalated:
+            def report_batch(sub_indices, batch_results):
+                on_batch([escalated[j] for j in sub_indices], batch_results)
             
-            return {
-                'sentiment': sentiment,
-                'confidence': confidence
-            }
-        except Exception as e:
-            print(f"❌ Sentiment analysis error: {e}")
-            return {'sentiment': 'NEUTRAL', 'confidence': 0.0}
+            model_results = self._infer_transformer(
+                [texts[i] for i in escalated], report_batch if on_batch else None, tier='transformer'
+            )
+            for i, result in zip(escalated, model_results):
+                results[i] = result
+        
+        self.last_cascade_stats = {
+            'lexicon_decided': len(decided),
+            'escalated': len(escalated),
+            'escalation_rate': round(len(escalated) / len(texts), 4) if texts else 0.0
+        }
+        print(f"   Sentiment cascade: {len(decided)} decided by lexicon, {len(escalated)} escalated to transformer")
+        return results
     
-    def analyze_batch(self, texts):
-        """Analyze sentiment for multiple texts - OPTIMIZED"""
+    def _infer_transformer(self, texts, on_batch=None, tier=None):
+        """
+        Run texts through the model using length-bucketed batches.
+        on_batch(indices, results) is called as each bucket completes.
+        """
+        # Truncate all texts
+        truncated_texts = [text[:512] for text in texts]
+        
+        # Sort by token length and bucket under the token budget,
+        # so each batch is padded only to similar-length texts
+        lengths = self._token_lengths(truncated_texts)
+        max_batch = self.batch_size
+        if self.workers > 1:
+            # Make at least one shard per worker process
+            max_batch = min(max_batch, math.ceil(len(truncated_texts) / self.workers))
+        buckets = self._make_buckets(lengths, max_batch)
+        batches = [[truncated_texts[i] for i in bucket] for bucket in buckets]
+        results = [None] * len(truncated_texts)
+        padded_tokens = 0
+        
+        if self.workers > 1:
+            all_batch_results = self.analyzer.predict_many(batches)
+        else:
+            all_batch_results = (self.analyzer.predict(batch) for batch in batches)
+        
+        for bucket, batch_results in zip(buckets, all_batch_results):
+            # Scatter back into the original order
+            for idx, result in zip(bucket, batch_results):
+                results[idx] = self._format_result(result)
+                if tier:
+                    results[idx]['tier'] = tier
+            padded_tokens += len(bucket) * max(lengths[i] for i in bucket)
+            if on_batch:
+                on_batch(bucket, [results[idx] for idx in bucket])
+        
+        self.last_batch_stats = {
+            'texts': len(truncated_texts),
+            'batches': len(buckets),
+            'real_tokens': sum(lengths),
+            'padded_tokens': padded_tokens,
+            'padding_efficiency': round(sum(lengths) / padded_tokens, 4) if padded_tokens else 1.0
+        }
+        print(f"   Sentiment batching: {len(truncated_texts)} texts in {len(buckets)} batches "
+              f"(padding efficiency {self.last_batch_stats['padding_efficiency']:.0%})")
+        return results
+    
+    def analyze_batch(self, texts, on_batch=None):
+        """
+        Analyze sentiment for multiple texts, sending only cache misses to the model.
+        If given, on_batch(indices, results) is called with partial results:
+        first for cache hits, then once per completed inference batch.
+        """
         if not self.analyzer:
             return [{'sentiment': 'NEUTRAL', 'confidence': 0.0}] * len(texts)
         
+        if not texts:
+            return []
+        
         try:
-            # Truncate all texts
-            truncated_texts = [text[:512] for text in texts]
+            keys = [make_key(text, self.model_id) for text in texts]
+            cached = self.cache.get_many(keys) if self.cache else {}
             
-            # Batch process for speed (process 8 at a time)
-            batch_size = 8
-            results = []
+            # Unique misses, batched together (duplicates inside the request run once)
+            miss_texts = {}
+            positions = {}
+            for i, (key, text) in enumerate(zip(keys, texts)):
+                if key not in cached:
+                    miss_texts.setdefault(key, text)
+                    positions.setdefault(key, []).append(i)
             
-            for i in range(0, len(truncated_texts), batch_size):
-                batch = truncated_texts[i:i + batch_size]
-                batch_results = self.analyzer(batch)
-                results.extend(batch_results)
+            if on_batch:
+                hit_indices = [i for i, key in enumerate(keys) if key in cached]
+                if hit_indices:
+                    on_batch(hit_indices, [dict(cached[keys[i]]) for i in hit_indices])
             
-            formatted_results = []
-            for result in results:
-                sentiment = result['label']
-                confidence = round(result['score'], 4)
+            if miss_texts:
+                miss_keys = list(miss_texts.keys())
                 
-                # Apply neutral detection (same as analyze method)
-                if confidence < 0.65:
-                    sentiment = 'NEUTRAL'
+                def report_batch(miss_indices, batch_results):
+                    # Fan each unique miss back out to every position with that text
+                    indices, results = [], []
+                    for miss_index, result in zip(miss_indices, batch_results):
+                        for position in positions[miss_keys[miss_index]]:
+                            indices.append(position)
+                            results.append(dict(result))
+                    on_batch(indices, results)
                 
-                formatted_results.append({
-                    'sentiment': sentiment,
-                    'confidence': confidence
-                })
+                fresh = dict(zip(miss_keys, self._infer_batch(
+                    list(miss_texts.values()), on_batch=report_batch if on_batch else None
+                )))
+                if self.cache:
+                    self.cache.set_many(fresh)
+                cached.update(fresh)
+            
+            if self.cache:
+                print(f"   Sentiment cache: {len(texts) - len(miss_texts)}/{len(texts)} served from cache")
             
-            return formatted_results
+            return [dict(cached[key]) for key in keys]
             
         except Exception as e:
             print(f"❌ Batch sentiment analysis error: {e}")
+            self.errors += 1
             return [{'sentiment': 'NEUTRAL', 'confidence': 0.0}] * len(texts)
     
+    def warmup(self):
+        """Run a dummy batch at each bucket size so first requests skip lazy init costs"""
+        if not self.analyzer:
+            return
+        
+        sizes = []
+        size = 1
+        while size < self.batch_size:
+            sizes.append(size)
+            size *= 2
+        sizes.append(self.batch_size)
+        
+        for size in sizes:
+            batch = ["warming up the sentiment model"] * size
+            if self.workers > 1:
+                list(self.analyzer.predict_many([batch] * self.workers))
+            else:
+                self.analyzer.predict(batch)
+        print(f"✅ Sentiment model warmed up (batch sizes {sizes})")
+    
+    def calibration_report(self, texts, labels, bands=None):
+        """
+        Accuracy vs. fraction escalated on a labeled sample, for several
+        (low, high) uncertainty bands. Labels are POSITIVE/NEGATIVE/NEUTRAL.
+        Both tiers score every text once; each band is then simulated.
+        """
+        bands = bands or [(0.5, 0.5), (0.3, 0.7), (0.2, 0.8), (0.1, 0.9), (0.05, 0.95), (0.0, 1.0)]
+        truncated_texts = [text[:512] for text in texts]
+        lexicon = self.lexicon or LexiconScorer()
+        
+        lexicon_predictions = lexicon.score_batch(truncated_texts)
+        model_labels = [r['sentiment'] for r in self._infer_transformer(truncated_texts)]
+        lexicon_labels = [self._format_result(p)['sentiment'] for p in lexicon_predictions]
+        positive_probs = [p['score'] if p['label'] == 'POSITIVE' else 1.0 - p['score'] for p in lexicon_predictions]
+        
+        expected = [label.upper() for label in labels]
+        total = len(expected) or 1
+        rows = []
+        for low, high in bands:
+            escalate = [low < p < high for p in positive_probs]
+            predicted = [m if e else l for m, l, e in zip(model_labels, lexicon_labels, escalate)]
+            correct = sum(1 for p, y in zip(predicted, expected) if p == y)
+            rows.append({
+                'low': low,
+                'high': high,
+                'accuracy': round(correct / total, 4),
+                'escalated_fraction': round(sum(escalate) / total, 4)
+            })
+        
+        transformer_correct = sum(1 for p, y in zip(model_labels, expected) if p == y)
+        return {
+            'samples': len(expected),
+            'transformer_accuracy': round(transformer_correct / total, 4),
+            'bands': rows
+        }
+    
+    def get_cache_stats(self):
+        """Result cache hit/miss counters"""
+        return self.cache.stats() if self.cache else {'enabled': False}
+    
     def get_overall_sentiment(self, sentiments):
         """Calculate overall sentiment statistics"""
         positive = sum(1 for s in sentiments if s['sentiment'] == 'POSITIVE')
@@ -0,0 +1,203 @@
+import os
+import sys
+
+MODEL_NAME = "distilbert-base-uncased-finetuned-sst-2-english"
+
+BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+
+class TorchBackend:
+    """Hugging Face transformers pipeline on PyTorch (the reference backend)"""
+    name = 'torch'
+
+    def __init__(self, model_name=MODEL_NAME):
+        from transformers import pipeline
+        import torch
+
+        self.model_name = model_name
+        self.pipeline = pipeline(
+            "sentiment-analysis",
+            model=model_name,
+            device=0 if torch.cuda.is_available() else -1,
+            truncation=True,
+            max_length=512
+        )
+        self.tokenizer = self.pipeline.tokenizer
+
+    def predict(self, texts):
+        """Return [{'label', 'score'}] for each text"""
+        return self.pipeline(texts, batch_size=len(texts))
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime inference on CPU, optionally with a dynamically
+    int8-quantized graph. The model is exported once and reused from disk.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, quantize=False, model_dir=None):
+        import numpy as np
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.np = np
+        self.model_name = model_name
+        self.quantize = quantize
+        self.name = 'onnx-int8' if quantize else 'onnx'
+        self.model_dir = model_dir or os.getenv('SENTIMENT_ONNX_DIR', os.path.join('models', 'onnx'))
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        config = AutoConfig.from_pretrained(model_name)
+        self.id2label = {int(k): v for k, v in config.id2label.items()}
+
+        model_path = self._ensure_model()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = int(os.getenv('SENTIMENT_ONNX_THREADS', 0))
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        print(f"✅ ONNX Runtime session loaded: {model_path}")
+
+    def _paths(self):
+        base = os.path.join(self.model_dir, self.model_name.replace('/', '_'))
+        return base + '.onnx', base + '.int8.onnx'
+
+    def _export(self, path):
+        """Export the PyTorch model to ONNX with dynamic batch/sequence axes"""
+        import torch
+        from transformers import AutoModelForSequenceClassification
+
+        print(f"📦 Exporting {self.model_name} to ONNX (one-time)...")
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+        model.eval()
+        sample = self.tokenizer(["export sample"], return_tensors='pt')
+        torch.onnx.export(
+            model,
+            (sample['input_ids'], sample['attention_mask']),
+            path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'logits': {0: 'batch'}
+            },
+            opset_version=14
+        )
+
+    @staticmethod
+    def _write_atomically(path, write):
+        """
+        Run write(tmp_path), then move the file into place. Pool workers and
+        pre-fork server workers can start at once: each writes its own temp
+        file, and nobody ever loads a half-written graph.
+        """
+        base, ext = os.path.splitext(path)
+        tmp_path = f"{base}.tmp{os.getpid()}{ext}"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _ensure_model(self):
+        """Return the path of the ONNX graph to load, exporting/quantizing if needed"""
+        fp32_path, int8_path = self._paths()
+        os.makedirs(self.model_dir, exist_ok=True)
+
+        if not os.path.exists(fp32_path):
+            self._write_atomically(fp32_path, self._export)
+
+        if not self.quantize:
+            return fp32_path
+
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            print("📦 Quantizing ONNX model to int8 (one-time)...")
+            self._write_atomically(
+                int8_path, lambda tmp_path: quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            )
+        return int8_path
+
+    def predict(self, texts):
+        """Return [{'label', 'score'}] for each text"""
+        np = self.np
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=512, return_tensors='np')
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        logits = self.session.run(None, feeds)[0]
+
+        # Softmax over classes
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        label_ids = probs.argmax(axis=1)
+        return [
+            {'label': self.id2label[int(label_id)], 'score': float(probs[row, label_id])}
+            for row, label_id in enumerate(label_ids)
+        ]
+
+
+def create_backend(kind=None, model_name=MODEL_NAME):
+    """Build the inference backend selected by SENTIMENT_BACKEND"""
+    kind = (kind or os.getenv('SENTIMENT_BACKEND', 'torch')).lower()
+    if kind == 'torch':
+        return TorchBackend(model_name)
+    if kind == 'onnx':
+        return OnnxBackend(model_name, quantize=False)
+    if kind == 'onnx-int8':
+        return OnnxBackend(model_name, quantize=True)
+    raise ValueError(f"Unknown sentiment backend '{kind}' (expected one of {', '.join(BACKENDS)})")
+
+
+def parity_report(texts, backend, reference, neutral_threshold=0.65):
+    """
+    Compare a backend against a reference backend (normally PyTorch).
+    Label agreement is measured on the final labels, after the NEUTRAL
+    threshold is applied, since that is what the API returns.
+    """
+    def final_label(result):
+        return result['label'] if result['score'] >= neutral_threshold else 'NEUTRAL'
+
+    candidate = backend.predict(texts)
+    expected = reference.predict(texts)
+
+    agree = sum(1 for c, e in zip(candidate, expected) if final_label(c) == final_label(e))
+    score_diffs = [
+        abs(c['score'] - e['score']) for c, e in zip(candidate, expected) if c['label'] == e['label']
+    ]
+    return {
+        'backend': backend.name,
+        'reference': reference.name,
+        'samples': len(texts),
+        'label_agreement': round(agree / len(texts), 4) if texts else 1.0,
+        'max_score_diff': round(max(score_diffs), 4) if score_diffs else 0.0,
+        'mean_score_diff': round(sum(score_diffs) / len(score_diffs), 4) if score_diffs else 0.0
+    }
+
+
+if __name__ == '__main__':
+    # Usage: python sentiment_backends.py [texts.txt]  (one text per line)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as f:
+            sample = [line.strip() for line in f if line.strip()]
+    else:
+        sample = [
+            "Really excited about this! Absolutely amazing!",
+            "Terrible experience. Would NOT recommend to anyone",
+            "Just heard about it. Anyone have real experience with this?",
+            "Not impressed at all. Very disappointing experience",
+            "Best decision ever, love it!",
+            "Heard mixed things about it. Need more data to decide."
+        ]
+
+    reference = TorchBackend()
+    for kind in ('onnx', 'onnx-int8'):
+        report = parity_report(sample, create_backend(kind), reference)
+        print(f"{report['backend']:>10}: label agreement {report['label_agreement']:.2%} "
+              f"over {report['samples']} texts (mean score diff {report['mean_score_diff']})")
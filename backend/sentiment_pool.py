@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Per-process model, created by _init_worker in each pool process
+_worker_backend = None
+
+
+def _init_worker(backend_name, model_name, threads):
+    """Pin the torch/ONNX thread budget, then load this worker's model copy"""
+    global _worker_backend
+
+    # Must be set before torch/onnxruntime create their thread pools
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    os.environ['SENTIMENT_ONNX_THREADS'] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass
+
+    from sentiment_backends import create_backend
+    _worker_backend = create_backend(backend_name, model_name)
+
+
+def _predict_shard(texts):
+    return _worker_backend.predict(texts)
+
+
+class ShardedSentimentPool:
+    """
+    Process pool where each worker holds its own model copy and a fixed
+    torch thread budget, so inference scales with cores instead of
+    contending on one interpreter's GIL and intra-op thread pool.
+    """
+
+    def __init__(self, backend_name, model_name, workers, threads_per_worker=None):
+        self.name = backend_name
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+
+        # spawn: never fork a process that already has torch thread pools
+        context = multiprocessing.get_context('spawn')
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(backend_name, model_name, self.threads_per_worker)
+        )
+        # Load every worker's model now instead of on the first request
+        list(self.predict_many([["warm up"]] * workers))
+        print(f"✅ Sentiment process pool ready ({workers} workers x {self.threads_per_worker} threads)")
+
+    def predict(self, texts):
+        """Score a single batch on one worker"""
+        return self.executor.submit(_predict_shard, texts).result()
+
+    def predict_many(self, batches):
+        """
+        Score a list of batches across workers. Returns an iterator that
+        yields each batch's results in input order as soon as it is ready.
+        """
+        return self.executor.map(_predict_shard, batches)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,105 @@
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed (compression would not pay off)
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+# Fast levels: every response is compressed on the fly
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 5))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 4))
+
+# In server preference order; brotli only when the module is installed
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+
+def _default(value):
+    """Types neither encoder handles natively (Mongo ids, numpy scalars and arrays)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+SERIALIZERS = {'json': _stdlib_dumps}
+if orjson is not None:
+    SERIALIZERS['orjson'] = _orjson_dumps
+
+
+def get_serializer(name=None):
+    """
+    dumps(obj) -> compact UTF-8 JSON bytes. name (or JSON_SERIALIZER) picks
+    one of SERIALIZERS; 'auto' prefers orjson and falls back to the stdlib.
+    Both write datetimes as ISO 8601.
+    """
+    name = (name or os.getenv('JSON_SERIALIZER', 'auto')).lower()
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in SERIALIZERS else 'json'
+    if name not in SERIALIZERS:
+        print(f"⚠️ JSON serializer '{name}' unavailable - using the stdlib encoder")
+        name = 'json'
+    return SERIALIZERS[name]
+
+
+dumps = get_serializer()
+
+
+def compress(body, encoding):
+    """body encoded with 'br' or 'gzip'"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def to_columnar(records):
+    """
+    List of dicts as {'count', 'columns': {field: [values]}}. Dict-valued
+    fields (author, metrics, sentiment, ...) are flattened one level into
+    'field.key' columns, so each key is sent once instead of once per record.
+    """
+    fields = {}  # field -> ordered sub-keys, or None for a plain field
+    for record in records:
+        for field, value in record.items():
+            if isinstance(value, dict):
+                keys = fields.get(field) or {}
+                keys.update(dict.fromkeys(value))
+                fields[field] = keys
+            else:
+                fields.setdefault(field, None)
+
+    columns = {}
+    for field, keys in fields.items():
+        if keys is None:
+            columns[field] = [record.get(field) for record in records]
+            continue
+        values = [record.get(field) for record in records]
+        values = [value if isinstance(value, dict) else {} for value in values]
+        for key in keys:
+            columns[f"{field}.{key}"] = [value.get(key) for value in values]
+    return {'count': len(records), 'columns': columns}
+
+
+def columnar_result(result):
+    """An analysis result with its tweets in the columnar layout"""
+    if not isinstance(result, dict) or not isinstance(result.get('tweets'), list):
+        return result
+    return {**result, 'tweets': to_columnar(result['tweets']), 'layout': 'columnar'}
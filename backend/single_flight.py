@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Duplicate-call suppression: while fn is running for a key, other
+    callers with the same key wait for that call's result instead of
+    starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn, timeout=None):
+        """Return (fn(), shared); shared is True when another caller's run was reused"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return call.result(timeout=timeout), True
+
+        try:
+            value = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(value)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return value, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'shared': self.shared
+            }
@@ -1,70 +1,179 @@
 import os
-import requests
+import re
 from dotenv import load_dotenv
-import time
+
+from perspective_client import DEFAULT_API_URL, DEFAULT_ATTRIBUTES, PerspectiveClient
+from result_cache import ResultCache, make_key
+from toxicity_model import DEFAULT_MODEL_PATH, ToxicityModel
 
 load_dotenv()
 
+# Keyword lists for the fallback detector, by category
+TOXIC_KEYWORDS = [
+    'idiot', 'stupid', 'moron', 'hate', 'garbage', 'pathetic', 
+    'worst', 'terrible', 'awful', 'disgusting', 'bs', 'crap',
+    'suck', 'useless', 'worthless', 'trash', 'junk', 'horrible',
+    'dumb', 'ridiculous', 'absurd', 'nonsense', 'shame', 'disaster',
+    'failure', 'failed', 'scam', 'fake', 'lie', 'lies', 'lying',
+    'corrupt', 'corruption', 'evil', 'wrong', 'bad', 'worse'
+]
+SEVERE_KEYWORDS = ['kill', 'die', 'death', 'threat', 'attack', 'destroy', 'harm', 'violence']
+INSULT_KEYWORDS = [
+    'idiot', 'stupid', 'moron', 'dumb', 'fool', 'loser',
+    'clown', 'joke', 'failure', 'incompetent', 'ignorant'
+]
+PROFANITY_KEYWORDS = ['damn', 'hell', 'crap', 'bs', 'wtf', 'shit', 'fuck']
+# Negative sentiment indicators (strong negative words)
+NEGATIVE_INDICATORS = ['not', 'never', 'no', 'dont', "don't", 'cant', "can't", 'wont', "won't"]
+
+
+class KeywordMatcher:
+    """
+    All keyword categories compiled once into a trie-shaped regex plus
+    per-category bitmasks (one bit per keyword).
+    
+    Keywords never contain whitespace, so a substring match can never cross
+    a space: each distinct whitespace-separated token is resolved to the
+    bitmask of keywords it contains and the masks are OR-ed together.
+    Tokens are mostly common words, so their masks are memoized and a
+    typical tweet costs one split plus a few dict lookups. This keeps the
+    original substring semantics (no word boundaries) exactly.
+    """
+    
+    def __init__(self, categories, memo_size=100000):
+        self.categories = categories
+        keywords = sorted({word for words in categories.values() for word in words}, key=len, reverse=True)
+        # Zero-width lookahead: the longest keyword starting at every position
+        self.pattern = re.compile('(?=(' + self._trie_regex(keywords) + '))')
+        # A match sets the bits of every keyword that is a prefix of it (itself
+        # included): shorter keywords at the same position are its prefixes
+        bit = {word: 1 << i for i, word in enumerate(keywords)}
+        self.prefix_bits = {
+            word: sum(bit[other] for other in keywords if word.startswith(other))
+            for word in keywords
+        }
+        self.category_masks = [
+            (name, sum(bit[word] for word in set(words)))
+            for name, words in categories.items()
+        ]
+        self.memo_size = memo_size
+        self._token_masks = {}
+    
+    @staticmethod
+    def _trie_regex(words):
+        """
+        Regex for a set of words, factored by common prefix so the engine
+        never retries shared prefixes. Optional suffixes are greedy, so the
+        longest keyword at a position wins.
+        """
+        trie = {}
+        for word in words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[''] = True
+        
+        def build(node):
+            terminal = '' in node
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            if terminal:
+                return '(?:' + body + ')?'
+            return body
+        
+        return build(trie)
+    
+    def _token_mask(self, token):
+        """Bitmask of the keywords found inside one token"""
+        mask = 0
+        for longest in self.pattern.findall(token):
+            mask |= self.prefix_bits[longest]
+        if len(self._token_masks) >= self.memo_size:
+            self._token_masks.clear()
+        self._token_masks[token] = mask
+        return mask
+    
+    def count(self, text_lower):
+        """Number of distinct keywords of each category found in the text"""
+        matched = 0
+        token_masks = self._token_masks
+        for token in set(text_lower.split()):
+            mask = token_masks.get(token)
+            matched |= self._token_mask(token) if mask is None else mask
+        return {name: bin(matched & mask).count('1') for name, mask in self.category_masks}
+
+_KEYWORD_MATCHER = KeywordMatcher({
+    'toxic': TOXIC_KEYWORDS,
+    'severe': SEVERE_KEYWORDS,
+    'insult': INSULT_KEYWORDS,
+    'profanity': PROFANITY_KEYWORDS,
+    'negative': NEGATIVE_INDICATORS
+})
+
 class ToxicityDetector:
     def __init__(self):
         self.api_key = os.getenv('PERSPECTIVE_API_KEY')
-        self.api_url = 'https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze'
+        self.api_url = os.getenv('PERSPECTIVE_API_URL', DEFAULT_API_URL)
+        self.client = None
+        
+        # Local hashed n-gram model (train_toxicity_model.py); keywords if absent
+        self.model = None
+        model_path = os.getenv('TOXICITY_MODEL_PATH', DEFAULT_MODEL_PATH)
+        if os.path.exists(model_path):
+            try:
+                self.model = ToxicityModel.load(model_path)
+                print(f"✅ Local toxicity model loaded ({self.model.featurizer.n_features} features)")
+            except Exception as e:
+                print(f"⚠️ Could not load toxicity model from {model_path}: {e} - using keywords")
         
         if not self.api_key:
             print("⚠️ PERSPECTIVE_API_KEY not found - toxicity detection disabled")
         else:
+            # Pooled, rate-limited client; falls back to the local tier per call
+            self.client = PerspectiveClient(self.api_key, fallback=self._local_response, api_url=self.api_url)
             print("✅ Toxicity Detector initialized")
+        
+        # Cache of Perspective scores keyed by normalized text + requested attributes,
+        # so repeated texts cost a lookup instead of quota (TOXICITY_CACHE_SIZE=0 disables it)
+        self.attributes = DEFAULT_ATTRIBUTES
+        self.cache_namespace = 'perspective:' + ','.join(sorted(self.attributes))
+        cache_size = int(os.getenv('TOXICITY_CACHE_SIZE', 10000))
+        self.cache = ResultCache(
+            max_entries=cache_size,
+            path=os.getenv('TOXICITY_CACHE_PATH') or None,
+            table='toxicity',
+            ttl=float(os.getenv('TOXICITY_CACHE_TTL', 86400)) or None
+        ) if cache_size > 0 and self.client else None
+    
+    def _format_scores(self, scores):
+        """Convert Perspective attributeScores into our response format"""
+        def value(attribute):
+            return scores.get(attribute, {}).get('summaryScore', {}).get('value', 0)
+        
+        toxicity_score = value('TOXICITY')
+        return {
+            'toxicity': round(toxicity_score, 4),
+            'severe_toxicity': round(value('SEVERE_TOXICITY'), 4),
+            'identity_attack': round(value('IDENTITY_ATTACK'), 4),
+            'insult': round(value('INSULT'), 4),
+            'profanity': round(value('PROFANITY'), 4),
+            'threat': round(value('THREAT'), 4),
+            'is_toxic': toxicity_score > 0.7
+        }
     
     def analyze(self, text):
         """
         Analyze toxicity using Google Perspective API
         """
-        if not self.api_key:
+        if not self.client:
             return self._default_response(text)
         
-        try:
-            params = {'key': self.api_key}
-            
-            data = {
-                'comment': {'text': text[:20000]},  # API limit
-                'languages': ['en'],
-                'requestedAttributes': {
-                    'TOXICITY': {},
-                    'SEVERE_TOXICITY': {},
-                    'IDENTITY_ATTACK': {},
-                    'INSULT': {},
-                    'PROFANITY': {},
-                    'THREAT': {}
-                }
-            }
-            
-            response = requests.post(self.api_url, params=params, json=data, timeout=5)
-            
-            if response.status_code == 200:
-                result = response.json()
-                scores = result.get('attributeScores', {})
-                
-                toxicity_score = scores.get('TOXICITY', {}).get('summaryScore', {}).get('value', 0)
-                
-                return {
-                    'toxicity': round(toxicity_score, 4),
-                    'severe_toxicity': round(scores.get('SEVERE_TOXICITY', {}).get('summaryScore', {}).get('value', 0), 4),
-                    'identity_attack': round(scores.get('IDENTITY_ATTACK', {}).get('summaryScore', {}).get('value', 0), 4),
-                    'insult': round(scores.get('INSULT', {}).get('summaryScore', {}).get('value', 0), 4),
-                    'profanity': round(scores.get('PROFANITY', {}).get('summaryScore', {}).get('value', 0), 4),
-                    'threat': round(scores.get('THREAT', {}).get('summaryScore', {}).get('value', 0), 4),
-                    'is_toxic': toxicity_score > 0.7
-                }
-            else:
-                print(f"⚠️ Perspective API error: {response.status_code} - Using fallback detection")
-                return self._default_response(text)
-                
-        except Exception as e:
-            print(f"❌ Toxicity detection error: {e} - Using fallback detection")
-            return self._default_response(text)
+        return self.analyze_batch([text])[0]
     
-    def _default_response(self, text=""):
-        """Fallback toxicity detection using keyword matching"""
+    def _default_response(self, text="", lowered=None):
+        """Fallback toxicity detection using keyword matching (lowered: text.lower(), if known)"""
         if not text:
             return {
                 'toxicity': 0.0,
@@ -76,34 +185,13 @@ class ToxicityDetector:
                 'is_toxic': False
             }
         
-        # Keyword-based toxicity detection (fallback)
-        text_lower = text.lower()
-        
-        # Expanded keyword lists with more realistic patterns
-        toxic_keywords = [
-            'idiot', 'stupid', 'moron', 'hate', 'garbage', 'pathetic', 
-            'worst', 'terrible', 'awful', 'disgusting', 'bs', 'crap',
-            'suck', 'useless', 'worthless', 'trash', 'junk', 'horrible',
-            'dumb', 'ridiculous', 'absurd', 'nonsense', 'shame', 'disaster',
-            'failure', 'failed', 'scam', 'fake', 'lie', 'lies', 'lying',
-            'corrupt', 'corruption', 'evil', 'wrong', 'bad', 'worse'
-        ]
-        severe_keywords = ['kill', 'die', 'death', 'threat', 'attack', 'destroy', 'harm', 'violence']
-        insult_keywords = [
-            'idiot', 'stupid', 'moron', 'dumb', 'fool', 'loser',
-            'clown', 'joke', 'failure', 'incompetent', 'ignorant'
-        ]
-        profanity_keywords = ['damn', 'hell', 'crap', 'bs', 'wtf', 'shit', 'fuck']
-        
-        # Negative sentiment indicators (strong negative words)
-        negative_indicators = ['not', 'never', 'no', 'dont', "don't", 'cant', "can't", 'wont', "won't"]
-        
-        # Count matches (check if word exists as substring)
-        toxic_count = sum(1 for word in toxic_keywords if word in text_lower)
-        severe_count = sum(1 for word in severe_keywords if word in text_lower)
-        insult_count = sum(1 for word in insult_keywords if word in text_lower)
-        profanity_count = sum(1 for word in profanity_keywords if word in text_lower)
-        negative_count = sum(1 for word in negative_indicators if word in text_lower)
+        # Count matches (a keyword counts once if it appears anywhere as a substring)
+        counts = _KEYWORD_MATCHER.count(lowered if lowered is not None else text.lower())
+        toxic_count = counts['toxic']
+        severe_count = counts['severe']
+        insult_count = counts['insult']
+        profanity_count = counts['profanity']
+        negative_count = counts['negative']
         
         # Boost toxicity if multiple negative indicators + toxic words
         toxicity_boost = 0.1 if (negative_count >= 2 and toxic_count >= 1) else 0
@@ -127,14 +215,70 @@ class ToxicityDetector:
             'is_toxic': overall_toxicity > 0.3  # Lower threshold (30%)
         }
     
-    def analyze_batch(self, texts):
+    def _local_response(self, text):
+        """Single-text score from the local tier"""
+        return self.score_batch([text])[0]
+    
+    def score_batch(self, texts, lowered=None):
         """
-        Analyze toxicity for multiple texts with rate limiting
+        Local toxicity scores for a whole list of texts (no API calls): the
+        linear model if one is loaded, else keyword matching. lowered
+        (TweetBatch.lowered) saves lowercasing each text again.
         """
-        results = []
-        for i, text in enumerate(texts):
-            results.append(self.analyze(text))
-            # Rate limit: 1 request per second for free tier
-            if i < len(texts) - 1:
-                time.sleep(1.1)
-        return results
\ No newline at end of file
+        if self.model:
+            return self.model.score_batch(texts)
+        if lowered is None:
+            return [self._default_response(text) for text in texts]
+        return [self._default_response(text, text_lower) for text, text_lower in zip(texts, lowered)]
+    
+    def analyze_batch(self, texts, deadline=None, outcomes=None):
+        """
+        Analyze toxicity for multiple texts concurrently, within the
+        configured rate limit (PERSPECTIVE_QPS / PERSPECTIVE_BURST). Texts
+        the API has not scored by deadline (time.time()) use the local tier.
+        outcomes, if given, is a dict that receives the number of texts
+        served by each tier ('cache', 'perspective', 'model' or 'keywords').
+        """
+        local = 'model' if self.model else 'keywords'
+        if not self.client:
+            if outcomes is not None:
+                outcomes[local] = outcomes.get(local, 0) + len(texts)
+            return self.score_batch(texts)
+        
+        keys = [make_key(text, self.cache_namespace) for text in texts]
+        found = self.cache.get_many(keys) if self.cache else {}
+        tiers = dict.fromkeys(found, 'cache')
+        
+        # Only unique misses reach the rate-limited API
+        miss_texts = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                miss_texts.setdefault(key, text)
+        
+        if miss_texts:
+            responses = self.client.analyze_batch(list(miss_texts.values()), self._format_scores, deadline)
+            fresh = {}
+            for key, (result, from_api) in zip(miss_texts.keys(), responses):
+                found[key] = result
+                tiers[key] = 'perspective' if from_api else local
+                # Local fallbacks are not cached: the next call should retry the API
+                if from_api:
+                    fresh[key] = result
+            if self.cache:
+                self.cache.set_many(fresh)
+        
+        if outcomes is not None:
+            for key in keys:
+                outcomes[tiers[key]] = outcomes.get(tiers[key], 0) + 1
+        return [dict(found[key]) for key in keys]
+    
+    def get_stats(self):
+        """Local tier, Perspective client counters (calls, retries, fallbacks) and cache stats"""
+        local = 'model' if self.model else 'keywords'
+        if not self.client:
+            return {'api': False, 'local': local}
+        return {
+            'local': local,
+            **self.client.stats(),
+            'cache': self.cache.stats() if self.cache else {'enabled': False}
+        }
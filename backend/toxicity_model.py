@@ -0,0 +1,150 @@
+import os
+import re
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+# Output attributes, in weight-column order (same keys as ToxicityDetector)
+ATTRIBUTES = ('toxicity', 'severe_toxicity', 'identity_attack', 'insult', 'profanity', 'threat')
+
+DEFAULT_MODEL_PATH = os.path.join('models', 'toxicity_linear.npy')
+DEFAULT_FEATURES = 2 ** 15
+
+_URL_RE = re.compile(r'http\S+|www\S+')
+_TOKEN_RE = re.compile(r"[a-z0-9']+|[!?*#@$]")
+
+
+def tokenize(text):
+    """Lowercased word tokens; URLs dropped, masking punctuation (f*ck, !!!) kept"""
+    return _TOKEN_RE.findall(_URL_RE.sub(' ', (text or '').lower()))
+
+
+class HashedNgramFeaturizer:
+    """
+    Hashing-trick featurizer over word unigrams and bigrams.
+    Each n-gram is hashed with crc32 into one of n_features columns (a power
+    of two); the top hash bit picks the sign so collisions tend to cancel
+    instead of piling up. Rows are L2-normalized so short and long tweets
+    score on the same scale. No vocabulary is stored.
+    """
+
+    def __init__(self, n_features=DEFAULT_FEATURES):
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.n_features = n_features
+        self.mask = n_features - 1
+
+    def _hash(self, feature):
+        h = zlib.crc32(feature.encode('utf-8'))
+        return h & self.mask, -1.0 if h & 0x80000000 else 1.0
+
+    def transform(self, texts):
+        """Sparse CSR matrix (len(texts) x n_features)"""
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            tokens = tokenize(text)
+            row = {}
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                column, sign = self._hash(feature)
+                row[column] = row.get(column, 0.0) + sign
+            indices.extend(row.keys())
+            data.extend(row.values())
+            indptr.append(len(indices))
+
+        matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(texts), self.n_features)
+        )
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags((1.0 / norms).astype(np.float32)) @ matrix
+
+
+class ToxicityModel:
+    """
+    One-vs-rest logistic regression over hashed n-grams, one output column
+    per attribute. The whole model is a single (n_features + 1) x 6 float32
+    array (the last row is the bias) saved as .npy, so loading is a file read
+    and scoring a batch is one sparse matrix product.
+    """
+
+    def __init__(self, weights, threshold=0.7):
+        weights = np.asarray(weights, dtype=np.float32)
+        if weights.ndim != 2 or weights.shape[1] != len(ATTRIBUTES):
+            raise ValueError(f"expected an (n_features + 1) x {len(ATTRIBUTES)} weight array, got {weights.shape}")
+        self.featurizer = HashedNgramFeaturizer(weights.shape[0] - 1)
+        self.weights = weights[:-1]
+        self.bias = weights[-1]
+        self.threshold = threshold
+
+    @classmethod
+    def load(cls, path=None, threshold=0.7):
+        return cls(np.load(path or DEFAULT_MODEL_PATH), threshold=threshold)
+
+    def save(self, path=None):
+        path = path or DEFAULT_MODEL_PATH
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.save(path, np.vstack([self.weights, self.bias]))
+
+    def predict_proba(self, texts):
+        """(len(texts) x 6) attribute probabilities"""
+        if not texts:
+            return np.zeros((0, len(ATTRIBUTES)), dtype=np.float32)
+        features = self.featurizer.transform(texts)
+        probabilities = 1.0 / (1.0 + np.exp(-(features @ self.weights + self.bias)))
+        # Nothing to score (empty or URL-only text): same zeros as the keyword detector
+        probabilities[np.diff(features.indptr) == 0] = 0.0
+        return probabilities
+
+    def score_batch(self, texts):
+        """Results in the ToxicityDetector format, one dict per text"""
+        results = []
+        for row in self.predict_proba(texts).tolist():
+            result = {attribute: round(value, 4) for attribute, value in zip(ATTRIBUTES, row)}
+            result['is_toxic'] = row[0] > self.threshold
+            results.append(result)
+        return results
+
+    @classmethod
+    def fit(cls, texts, labels, n_features=DEFAULT_FEATURES, l2=1e-4, max_iter=200, threshold=0.7):
+        """
+        Train on texts and a (len(texts) x 6) label array of 0/1 targets (or
+        probabilities); NaN marks an attribute the dataset does not label,
+        which is left out of that column's loss. Minimizes L2-regularized log
+        loss for all columns jointly with L-BFGS.
+        """
+        from scipy.optimize import minimize
+
+        features = HashedNgramFeaturizer(n_features).transform(texts).tocsr()
+        labels = np.asarray(labels, dtype=np.float64)
+        known = ~np.isnan(labels)
+        targets = np.where(known, labels, 0.0)
+        counts = np.maximum(known.sum(axis=0), 1)
+        n_outputs = len(ATTRIBUTES)
+
+        def loss_and_grad(params):
+            weights = params[:-n_outputs].reshape(n_features, n_outputs)
+            bias = params[-n_outputs:]
+            logits = features @ weights + bias
+            # log(1 + e^z) - y*z, computed stably
+            losses = np.logaddexp(0.0, logits) - targets * logits
+            residual = (1.0 / (1.0 + np.exp(-logits)) - targets) * known / counts
+            loss = (losses * known).sum(axis=0) / counts
+            grad_weights = features.T @ residual + l2 * weights
+            return (
+                loss.sum() + 0.5 * l2 * np.sum(weights * weights),
+                np.concatenate([np.asarray(grad_weights).ravel(), residual.sum(axis=0)])
+            )
+
+        result = minimize(
+            loss_and_grad, np.zeros(n_features * n_outputs + n_outputs),
+            jac=True, method='L-BFGS-B', options={'maxiter': max_iter}
+        )
+        weights = result.x[:-n_outputs].reshape(n_features, n_outputs)
+        bias = result.x[-n_outputs:].copy()
+        # Unlabeled attributes predict ~0 instead of an untrained 0.5
+        bias[known.sum(axis=0) == 0] = -10.0
+        return cls(np.vstack([weights, bias]), threshold=threshold)
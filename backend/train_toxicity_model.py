@@ -0,0 +1,65 @@
+import csv
+import sys
+
+import numpy as np
+
+from toxicity_model import ATTRIBUTES, DEFAULT_FEATURES, DEFAULT_MODEL_PATH, ToxicityModel
+
+# Usage: python train_toxicity_model.py labeled.csv [output.npy] [n_features]
+# The CSV needs a 'text' column (or 'comment_text') and any of the attribute
+# columns below with 0/1 labels; Jigsaw column names are accepted too.
+# Attributes without a column are not trained and score ~0.
+COLUMN_ALIASES = {
+    'toxicity': ('toxicity', 'toxic'),
+    'severe_toxicity': ('severe_toxicity', 'severe_toxic'),
+    'identity_attack': ('identity_attack', 'identity_hate'),
+    'insult': ('insult',),
+    'profanity': ('profanity', 'obscene'),
+    'threat': ('threat',)
+}
+
+if len(sys.argv) < 2:
+    print("Usage: python train_toxicity_model.py labeled.csv [output.npy] [n_features]")
+    sys.exit(1)
+
+output_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODEL_PATH
+n_features = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_FEATURES
+
+with open(sys.argv[1], newline='', encoding='utf-8') as f:
+    reader = csv.DictReader(f)
+    text_column = 'text' if 'text' in reader.fieldnames else 'comment_text'
+    columns = {}
+    for attribute in ATTRIBUTES:
+        columns[attribute] = next((name for name in COLUMN_ALIASES[attribute] if name in reader.fieldnames), None)
+    rows = [row for row in reader if row.get(text_column)]
+
+texts = [row[text_column] for row in rows]
+labels = np.full((len(rows), len(ATTRIBUTES)), np.nan)
+for j, attribute in enumerate(ATTRIBUTES):
+    column = columns[attribute]
+    if column:
+        for i, row in enumerate(rows):
+            if row[column] != '':
+                labels[i, j] = float(row[column])
+
+# Hold out 10% to report quality
+split = int(len(texts) * 0.9)
+print(f"🏋️ Training on {split} texts ({n_features} hashed features)...")
+model = ToxicityModel.fit(texts[:split], labels[:split], n_features=n_features)
+model.save(output_path)
+
+print("=" * 60)
+print(f"📊 HELD-OUT EVALUATION ({len(texts) - split} texts)")
+print("=" * 60)
+if split < len(texts):
+    probabilities = model.predict_proba(texts[split:])
+    print(f"{'attribute':>16} {'accuracy':>10} {'positives':>10}")
+    for j, attribute in enumerate(ATTRIBUTES):
+        known = ~np.isnan(labels[split:, j])
+        if not known.any():
+            print(f"{attribute:>16} {'n/a':>10}")
+            continue
+        truth = labels[split:, j][known] >= 0.5
+        predicted = probabilities[known, j] >= 0.5
+        print(f"{attribute:>16} {np.mean(truth == predicted):>10.2%} {int(truth.sum()):>10}")
+print(f"✅ Saved model to {output_path}")
@@ -0,0 +1,79 @@
+import re
+
+# One pass per tweet: URLs and mentions match first and are dropped (empty
+# group); every other match is a lowercase word or hashtag token
+_TOKEN_RE = re.compile(r"https?://\S+|www\.\S+|@\w+|(#?[a-z0-9]+)")
+
+# Fields of a TwitterClient.search_tweets record, in response order
+TWEET_FIELDS = ('id', 'text', 'created_at', 'author', 'metrics', 'lang')
+
+
+def tokenize_tweet(lowered):
+    """Word and '#hashtag' tokens of lowercased tweet text, without URLs or mentions"""
+    return [token for token in _TOKEN_RE.findall(lowered) if token]
+
+
+class TweetBatch:
+    """
+    Columnar view of one fetch: parallel lists of ids, texts, authors,
+    metrics and timestamps, plus the lowercased text and its tokens,
+    computed once here for every stage (dedup, toxicity, topics).
+    Stages read columns instead of copying tweet dicts; records() builds
+    the response dicts once, at the end.
+    """
+    __slots__ = ('ids', 'texts', 'created_at', 'authors', 'metrics', 'langs', 'lowered', 'tokens', 'extras')
+
+    def __init__(self, ids, texts, created_at, authors, metrics, langs, extras=None):
+        self.ids = ids
+        self.texts = texts
+        self.created_at = created_at
+        self.authors = authors
+        self.metrics = metrics
+        self.langs = langs
+        # Any fields beyond TWEET_FIELDS, per tweet (usually None)
+        self.extras = extras or [None] * len(ids)
+        self.lowered = [text.lower() for text in texts]
+        self.tokens = [tokenize_tweet(text) for text in self.lowered]
+
+    @classmethod
+    def from_tweets(cls, tweets):
+        """Build from TwitterClient.search_tweets output"""
+        extras = [
+            {key: value for key, value in tweet.items() if key not in TWEET_FIELDS} or None
+            for tweet in tweets
+        ]
+        return cls(
+            ids=[tweet.get('id') for tweet in tweets],
+            texts=[tweet.get('text') or '' for tweet in tweets],
+            created_at=[tweet.get('created_at') for tweet in tweets],
+            authors=[tweet.get('author') for tweet in tweets],
+            metrics=[tweet.get('metrics') for tweet in tweets],
+            langs=[tweet.get('lang') for tweet in tweets],
+            extras=extras if any(extras) else None
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def record(self, i, **fields):
+        """Tweet i as a response dict, with extra per-tweet fields appended"""
+        record = {
+            'id': self.ids[i],
+            'text': self.texts[i],
+            'created_at': self.created_at[i],
+            'author': self.authors[i],
+            'metrics': self.metrics[i],
+            'lang': self.langs[i]
+        }
+        if self.extras[i]:
+            record.update(self.extras[i])
+        record.update(fields)
+        return record
+
+    def records(self, **columns):
+        """All tweets as response dicts; each keyword is a per-tweet column"""
+        names = list(columns)
+        return [
+            self.record(i, **dict(zip(names, values)))
+            for i, values in enumerate(zip(*columns.values()) if columns else ((),) * len(self))
+        ]
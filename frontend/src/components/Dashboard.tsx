@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { signOut } from 'firebase/auth';
 import { auth } from '../firebase';
 import { useNavigate } from 'react-router-dom';
@@ -45,30 +45,84 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
   const [statusMessage, setStatusMessage] = useState('');
   const [showAllTweets, setShowAllTweets] = useState(false);
   const [filter, setFilter] = useState<string>('all');
+  const socketRef = useRef<any>(null);
+  // The job this dashboard follows; events of earlier or finished jobs are ignored
+  const activeJobRef = useRef<string | null>(null);
+  const settledJobsRef = useRef<Set<string>>(new Set());
+
+  // Job events carry job_id; session events (synchronous requests) have none
+  const isActiveJob = (data: any) => {
+    const jobId = data?.job_id;
+    if (!jobId) return true;
+    if (settledJobsRef.current.has(jobId)) return false;
+    // Events can arrive before the submit response has told us the id
+    return activeJobRef.current === null || activeJobRef.current === jobId;
+  };
+
+  const settleJob = (jobId?: string) => {
+    if (jobId) settledJobsRef.current.add(jobId);
+  };
 
   // Connect to Socket.IO
   useEffect(() => {
-    const newSocket = io('http://localhost:5003');
+    // WebSocket only: behind several server workers, long-polling would need sticky sessions
+    const newSocket = io('http://localhost:5003', { transports: ['websocket'] });
+    socketRef.current = newSocket;
 
     newSocket.on('connect', () => {
       console.log('✅ Connected to Socket.IO');
     });
 
     newSocket.on('analysis_update', (data: any) => {
+      if (!isActiveJob(data)) return;
       console.log('📊 Analysis update:', data);
       setStatusMessage(data.message || '');
       setProgress(data.progress || 0);
     });
 
-    newSocket.on('analysis_complete', (data: any) => {
+    newSocket.on('analysis_partial', (data: any) => {
+      if (!isActiveJob(data)) return;
+      // Fill charts progressively as each sentiment batch is scored
+      setResult((prev: any) => {
+        const tweets = [...(prev?.tweets || []), ...(data.tweets || [])];
+        return {
+          ...prev,
+          query: data.query,
+          sentiment: data.sentiment,
+          tweets_analyzed: data.scored,
+          tweets
+        };
+      });
+      setProgress(data.progress || 0);
+      setStatusMessage(`🧠 Scored ${data.scored}/${data.total} tweets...`);
+    });
+
+    newSocket.on('analysis_complete', async (data: any) => {
+      if (!isActiveJob(data)) return;
+      // No partial of this job may be applied on top of the final result
+      settleJob(data.job_id);
       console.log('✅ Analysis complete:', data);
-      setResult(data);
+      // The event carries only the summary; fetch the tweets once from the result store
+      let final = data;
+      if (data.result_url) {
+        try {
+          const response = await fetch(`http://localhost:5003${data.result_url}`);
+          if (response.ok) final = await response.json();
+        } catch (err) {
+          console.error('❌ Failed to fetch result:', err);
+        }
+      }
+      // A new analysis may have started while the result was loading
+      if (data.job_id && activeJobRef.current && activeJobRef.current !== data.job_id) return;
+      setResult(final);
       setLoading(false);
       setProgress(100);
       setStatusMessage('Analysis complete!');
     });
 
     newSocket.on('analysis_error', (data: any) => {
+      if (!isActiveJob(data)) return;
+      settleJob(data.job_id);
       console.error('❌ Analysis error:', data);
       setError(data.error || 'Analysis failed');
       setLoading(false);
@@ -95,6 +149,55 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
     }
   };
 
+  // The socket id, once connected (or undefined if it does not connect within timeoutMs)
+  const waitForSocketId = (timeoutMs: number) => new Promise<string | undefined>((resolve) => {
+    const socket = socketRef.current;
+    if (!socket || socket.connected) {
+      resolve(socket?.id);
+      return;
+    }
+    const timer = setTimeout(() => {
+      socket.off('connect', onConnect);
+      resolve(undefined);
+    }, timeoutMs);
+    const onConnect = () => {
+      clearTimeout(timer);
+      resolve(socket.id);
+    };
+    socket.once('connect', onConnect);
+  });
+
+  // Without a socket no events arrive: follow the job through its status URL instead.
+  // Without a shared RESULT_STORE_PATH a poll can reach a worker that does not know
+  // the job, so a 404 is retried a few times before giving up
+  const pollJob = async (jobId: string, statusUrl: string) => {
+    let misses = 0;
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      if (activeJobRef.current !== jobId) return;  // a newer analysis took over
+      const response = await fetch(`http://localhost:5003${statusUrl}`);
+      if (response.status === 404 && ++misses < 5) continue;
+      if (!response.ok) {
+        throw new Error('Lost track of the analysis job');
+      }
+      misses = 0;
+      const job = await response.json();
+      if (activeJobRef.current !== jobId) return;
+      setProgress(job.progress || 0);
+      setStatusMessage(job.message || '');
+      if (job.status === 'done') {
+        setResult(job.result);
+        setLoading(false);
+        setProgress(100);
+        setStatusMessage('Analysis complete!');
+        return;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Analysis failed');
+      }
+    }
+  };
+
   const handleAnalyze = async (e: React.FormEvent) => {
     e.preventDefault();
 
@@ -103,6 +206,10 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
       return;
     }
 
+    // Whatever the previous job still sends is no longer shown
+    settleJob(activeJobRef.current ?? undefined);
+    activeJobRef.current = null;
+
     setError('');
     setLoading(true);
     setResult(null);
@@ -111,6 +218,7 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
     setShowAllTweets(false);
 
     try {
+      const sid = await waitForSocketId(3000);
       const response = await fetch('http://localhost:5003/api/analyze', {
         method: 'POST',
         headers: {
@@ -119,7 +227,9 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
         body: JSON.stringify({
           query: query,
           max_tweets: 100,  // Fetch 100 tweets for better analysis
-          uid: user?.uid
+          uid: user?.uid,
+          sid,  // Events go only to this session
+          async: true
         })
       });
 
@@ -129,7 +239,11 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
       }
 
       const data = await response.json();
-      console.log('✅ Analysis started:', data);
+      console.log('✅ Analysis queued:', data);
+      activeJobRef.current = data.job_id;
+      if (!sid) {
+        await pollJob(data.job_id, data.status_url);
+      }
 
     } catch (err: any) {
       console.error('❌ Analysis error:', err);